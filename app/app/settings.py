@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,6 +88,82 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Кеш відповідей апі рецептів
+RECIPE_CACHE_ALIAS = 'default'
+RECIPE_CACHE_TIMEOUT = int(os.environ.get('RECIPE_CACHE_TIMEOUT', 300))
+
+# Максимальна кількість рецептів в одному пакетному запиті
+RECIPE_BATCH_MAX_SIZE = 1000
+
+# Автодоповнення тегів і інгредієнтів: кількість результатів, ліміт часу
+# запиту в мілісекундах і розмір LRU кешу в пам'яті процесу
+RECIPE_AUTOCOMPLETE_LIMIT = 10
+RECIPE_AUTOCOMPLETE_MAX_LIMIT = 50
+RECIPE_AUTOCOMPLETE_TIMEOUT_MS = int(
+    os.environ.get('RECIPE_AUTOCOMPLETE_TIMEOUT_MS', 100))
+RECIPE_AUTOCOMPLETE_LRU_SIZE = 1024
+
+# Кількість рецептів, що читаються з курсора і доповнюються тегами та
+# інгредієнтами за раз при експорті
+RECIPE_EXPORT_CHUNK_SIZE = 2000
+
+# Варіанти зображень рецептів: назва -> (ширина, висота, обрізати до
+# точного розміру) і кількість процесів для їх генерації, при 0 варіанти
+# генеруються одразу в запиті
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (150, 150, True),
+    'small': (480, 480, False),
+    'medium': (1024, 1024, False),
+}
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+
+# Обмеження завантажених зображень рецептів: розмір файлу в байтах,
+# кількість пікселів, найбільша сторона і дозволені формати Pillow
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.environ.get('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+RECIPE_IMAGE_MAX_SIDE = 10_000
+RECIPE_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+
+# Зображення рецептів зберігаються під sha256 вмісту, однакові файли
+# спільні для рецептів. Файл без посилань видаляється командою
+# reclaim_recipe_images не раніше ніж через RECIPE_IMAGE_RECLAIM_GRACE
+# секунд
+RECIPE_IMAGE_CONTENT_ADDRESSED = os.environ.get(
+    'RECIPE_IMAGE_CONTENT_ADDRESSED', '1') == '1'
+RECIPE_IMAGE_RECLAIM_GRACE = int(
+    os.environ.get('RECIPE_IMAGE_RECLAIM_GRACE', 3600))
+
+# Копії зображень рецептів на запит: дозволені ширини, каталог дискового
+# кешу і його розмір у байтах, після якого витісняються найдавніше
+# використані копії
+RECIPE_IMAGE_RESIZE_WIDTHS = (160, 320, 480, 640, 960, 1280)
+RECIPE_IMAGE_RESIZE_CACHE_DIR = os.environ.get(
+    'RECIPE_IMAGE_RESIZE_CACHE_DIR', 'vol/web/media/resized')
+RECIPE_IMAGE_RESIZE_CACHE_MAX_BYTES = int(os.environ.get(
+    'RECIPE_IMAGE_RESIZE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+RECIPE_IMAGE_RESIZE_MAX_AGE = 24 * 60 * 60
+
+# Стиснення відповідей: мінімальний розмір у байтах, рівні gzip і brotli
+# та кеш стиснених байтів відповідей з ETag
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_CACHE_ALIAS = RECIPE_CACHE_ALIAS
+COMPRESSION_CACHE_TIMEOUT = RECIPE_CACHE_TIMEOUT
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -125,6 +203,14 @@ MEDIA_URL = 'static/media/'
 MEDIA_ROOT = 'vol/web/media'
 STATIC_ROOT = 'vol/web/static'
 
+# Віддача медіа: '' - FileResponse з Django, 'nginx' - X-Accel-Redirect на
+# internal location MEDIA_ACCEL_REDIRECT_PREFIX, 'apache' - X-Sendfile з
+# повним шляхом до файлу
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get(
+    'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected/media/')
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -134,6 +220,19 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # JSON через orjson, якщо він встановлений, або MessagePack
+    # за заголовками Accept і Content-Type
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
@@ -0,0 +1,101 @@
+"""
+Джанго команда яка порівнює час стиснення списку рецептів gzip і brotli
+з кількістю зекономлених байтів
+"""
+import gzip
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from core.middleware import brotli
+from core.models import Recipe
+from core.renderers import FastJSONRenderer, MessagePackRenderer
+from recipe.serializers import RecipeSerializer, RecipeReadSerializer
+
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_QUALITIES = (1, 5, 11)
+
+
+def _median_time(func, repeat):
+    """Медіана часу виконання і результат останнього запуску"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def get_compressors():
+    """Назва і функція стиснення для кожного рівня"""
+    compressors = [
+        (f'gzip-{level}',
+         lambda content, level=level: gzip.compress(content, level, mtime=0))
+        for level in GZIP_LEVELS
+    ]
+    if brotli is not None:
+        compressors += [
+            (f'br-{quality}',
+             lambda content, quality=quality: brotli.compress(
+                 content, quality=quality))
+            for quality in BROTLI_QUALITIES
+        ]
+    return compressors
+
+
+class Command(BaseCommand):
+    """Джанго команда для порівняння рівнів стиснення відповіді"""
+    help = ('Benchmarks CPU time against bytes saved for gzip and brotli '
+            'levels on the rendered recipe list, and the cost of reading '
+            'the compressed bytes back from the cache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', required=True, help='Email of the recipes owner.')
+        parser.add_argument(
+            '--rows', type=int, nargs='+', default=[1000, 10000],
+            help='List sizes to benchmark.')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Runs per measurement, the median is reported.')
+
+    def handle(self, *args, **options):
+        """Старт команди"""
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["user"]} does not exist')
+        if brotli is None:
+            self.stdout.write('brotli is not installed, only gzip is used')
+        cache = caches[settings.COMPRESSION_CACHE_ALIAS]
+        for rows in options['rows']:
+            queryset = Recipe.objects.filter(user=user).order_by(
+                '-id')[:rows].values(*RecipeReadSerializer.get_value_fields(
+                    RecipeSerializer.Meta.fields))
+            data = RecipeReadSerializer(queryset, many=True).data
+            for renderer in (FastJSONRenderer(), MessagePackRenderer()):
+                content = renderer.render(data)
+                self.stdout.write(
+                    f'{len(data)} rows, {renderer.format} '
+                    f'{len(content) / 1024:.1f} KiB:')
+                for name, compress in get_compressors():
+                    elapsed, compressed = _median_time(
+                        lambda: compress(content), options['repeat'])
+                    saved = len(content) - len(compressed)
+                    self.stdout.write(
+                        f'  {name}: {elapsed * 1000:.1f} ms, '
+                        f'{len(compressed) / 1024:.1f} KiB, '
+                        f'saved {saved / len(content):.1%}, '
+                        f'{saved / 1024 / (elapsed * 1000):.1f} KiB saved '
+                        f'per ms of CPU')
+                cache.set('benchmark_compression', compressed)
+                elapsed, _ = _median_time(
+                    lambda: cache.get('benchmark_compression'),
+                    options['repeat'])
+                cache.delete('benchmark_compression')
+                self.stdout.write(
+                    f'  cache hit: {elapsed * 1000:.2f} ms')
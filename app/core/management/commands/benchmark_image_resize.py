@@ -0,0 +1,130 @@
+"""
+Джанго команда яка вимірює частку попадань дискового кешу копій
+зображень і час їх генерації на запити з нерівномірною популярністю
+"""
+import io
+import random
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe
+from recipe.resize import get_resize_stats, reset_resize_stats
+
+ACCEPT = ('image/webp,image/*,*/*;q=0.8', 'image/jpeg')
+
+
+def noise_image(width, height):
+    """JPEG з шумом, який стискається як фото"""
+    buffer = io.BytesIO()
+    Image.effect_noise((width, height), 64).convert('RGB').save(
+        buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def _percentile(timings, percent):
+    """Перцентиль часу в мілісекундах"""
+    timings = sorted(timings)
+    index = min(len(timings) - 1, int(len(timings) * percent / 100))
+    return timings[index] * 1000
+
+
+class Command(BaseCommand):
+    """Джанго команда для вимірювання кешу копій зображень"""
+    help = ('Requests resized recipe images with Zipf-like popularity '
+            'through a temporary disk cache and reports the hit rate, '
+            'p99 generation time and request latency.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', required=True, help='Email of the recipes owner.')
+        parser.add_argument(
+            '--images', type=int, default=50,
+            help='Number of temporary recipes with images.')
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Number of requests.')
+        parser.add_argument(
+            '--cache-mib', type=float, nargs='+', default=[2, 64],
+            help='Cache sizes in MiB, small ones show eviction.')
+        parser.add_argument(
+            '--size', type=int, nargs=2, default=[2000, 1500],
+            help='Width and height of the source images.')
+
+    def handle(self, *args, **options):
+        """Старт команди"""
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["user"]} does not exist')
+        token, _ = Token.objects.get_or_create(user=user)
+        # test Client ходить на testserver, якого немає в ALLOWED_HOSTS
+        host = next((host for host in settings.ALLOWED_HOSTS
+                     if host != '*' and not host.startswith('.')),
+                    'localhost')
+        client = Client(
+            SERVER_NAME=host, HTTP_AUTHORIZATION=f'Token {token.key}')
+        with transaction.atomic():
+            recipes = []
+            try:
+                for i in range(options['images']):
+                    recipe = Recipe.objects.create(
+                        user=user, title='Benchmark', time_minutes=1,
+                        price=1)
+                    recipe.image.save('benchmark.jpg', ContentFile(
+                        noise_image(*options['size'])))
+                    recipes.append(recipe)
+                for cache_mib in options['cache_mib']:
+                    self._benchmark(client, recipes, cache_mib, options)
+            finally:
+                for recipe in recipes:
+                    recipe.image.storage.delete(recipe.image.name)
+                transaction.set_rollback(True)
+
+    def _benchmark(self, client, recipes, cache_mib, options):
+        """Запити через новий кеш заданого розміру"""
+        widths = settings.RECIPE_IMAGE_RESIZE_WIDTHS
+        keys = [(recipe, width, accept) for recipe in recipes
+                for width in widths for accept in ACCEPT]
+        random.Random(0).shuffle(keys)
+        # популярність ключа обернено пропорційна його рангу
+        weights = [1 / rank for rank in range(1, len(keys) + 1)]
+        workload = random.Random(1).choices(
+            keys, weights, k=options['requests'])
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(
+                RECIPE_IMAGE_RESIZE_CACHE_DIR=cache_dir,
+                RECIPE_IMAGE_RESIZE_CACHE_MAX_BYTES=int(
+                    cache_mib * 1024 * 1024)):
+            reset_resize_stats()
+            timings = []
+            for recipe, width, accept in workload:
+                url = reverse('recipe:recipe-resized-image',
+                              args=[recipe.id])
+                started = time.perf_counter()
+                response = client.get(
+                    url, {'width': width}, HTTP_ACCEPT=accept)
+                b''.join(response.streaming_content)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'Unexpected response {response.status_code}')
+            stats = get_resize_stats()
+        self.stdout.write(
+            f'cache {cache_mib:g} MiB, {len(keys)} keys, '
+            f'{len(workload)} requests: hit rate {stats["hit_rate"]:.1%} '
+            f'({stats["hits"]} hits, {stats["misses"]} misses), '
+            f'generation p99 {stats["generation_p99_ms"]:.1f} ms')
+        self.stdout.write(
+            f'  request p50 {statistics.median(timings) * 1000:.1f} ms, '
+            f'p99 {_percentile(timings, 99):.1f} ms')
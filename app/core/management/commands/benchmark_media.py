@@ -0,0 +1,113 @@
+"""
+Джанго команда яка вимірює пропускну здатність віддачі зображень
+рецептів через FileResponse
+"""
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe
+
+RANGE_BYTES = 64 * 1024
+
+
+def _median_time(func, repeat):
+    """Медіана часу виконання і результат останнього запуску"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def _fetch(client, url, **headers):
+    """Запит і прочитане тіло відповіді"""
+    response = client.get(url, **headers)
+    if response.streaming:
+        return response.status_code, b''.join(response.streaming_content)
+    return response.status_code, response.content
+
+
+class Command(BaseCommand):
+    """Джанго команда для вимірювання віддачі медіа без проксі"""
+    help = ('Benchmarks the FileResponse fallback of the media view: full '
+            'downloads, 64 KiB ranges and If-Modified-Since revalidation. '
+            'Files are read in Python here, a WSGI server with sendfile '
+            'only sends the headers from Python.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', required=True, help='Email of the recipes owner.')
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[256, 4096, 32768],
+            help='File sizes in KiB to benchmark.')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Requests per measurement, the median is reported.')
+
+    def handle(self, *args, **options):
+        """Старт команди"""
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["user"]} does not exist')
+        token, _ = Token.objects.get_or_create(user=user)
+        # test Client ходить на testserver, якого немає в ALLOWED_HOSTS
+        host = next((host for host in settings.ALLOWED_HOSTS
+                     if host != '*' and not host.startswith('.')),
+                    'localhost')
+        client = Client(
+            SERVER_NAME=host, HTTP_AUTHORIZATION=f'Token {token.key}')
+        for size in options['sizes']:
+            content = os.urandom(size * 1024)
+            with transaction.atomic():
+                recipe = Recipe.objects.create(
+                    user=user, title='Benchmark', time_minutes=1, price=1)
+                recipe.image.save('benchmark.jpg', ContentFile(content))
+                try:
+                    self._benchmark(
+                        client, recipe, content, options['repeat'])
+                finally:
+                    recipe.image.storage.delete(recipe.image.name)
+                    transaction.set_rollback(True)
+
+    def _benchmark(self, client, recipe, content, repeat):
+        """Вимірює запити одного файлу"""
+        url = reverse('media', kwargs={'path': recipe.image.name})
+        elapsed, (status, body) = _median_time(
+            lambda: _fetch(client, url), repeat)
+        if status != 200 or body != content:
+            raise CommandError(f'Unexpected response {status}')
+        self.stdout.write(
+            f'{len(content) // 1024} KiB: full {elapsed * 1000:.2f} ms, '
+            f'{len(content) / 1024 / 1024 / elapsed:.0f} MiB/s')
+
+        elapsed, (status, body) = _median_time(
+            lambda: _fetch(client, url,
+                           HTTP_RANGE=f'bytes=0-{RANGE_BYTES - 1}'),
+            repeat)
+        if status != 206 or body != content[:RANGE_BYTES]:
+            raise CommandError(f'Unexpected range response {status}')
+        self.stdout.write(
+            f'  range {RANGE_BYTES // 1024} KiB: {elapsed * 1000:.2f} ms, '
+            f'{1 / elapsed:.0f} req/s')
+
+        last_modified = client.get(url)['Last-Modified']
+        elapsed, (status, _) = _median_time(
+            lambda: _fetch(client, url, HTTP_IF_MODIFIED_SINCE=last_modified),
+            repeat)
+        if status != 304:
+            raise CommandError(f'Unexpected conditional response {status}')
+        self.stdout.write(
+            f'  not modified: {elapsed * 1000:.2f} ms, '
+            f'{1 / elapsed:.0f} req/s')
@@ -0,0 +1,261 @@
+"""
+Джанго команда для швидкого імпорту рецептів з NDJSON або CSV
+"""
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import bump_user_version
+from recipe.export import CSV_NAMES_SEPARATOR
+from recipe.serializers import get_or_create_attrs
+
+RECIPE_FIELDS = ('title', 'description', 'time_minutes', 'price', 'link')
+RELATED = (
+    ('tags', Tag, Recipe.tags.through, 'tag_id'),
+    ('ingredients', Ingredient, Recipe.ingredients.through,
+     'ingredient_id'),
+)
+
+
+def read_ndjson(stream):
+    """
+    Рядки NDJSON як словники, некоректний JSON повертається рядком
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def read_csv(stream):
+    """
+    Рядки CSV у форматі експорту, назви розділені CSV_NAMES_SEPARATOR
+    """
+    for row in csv.DictReader(stream):
+        for key, _, _, _ in RELATED:
+            row[key] = [
+                name for name in (row.get(key) or '').split(
+                    CSV_NAMES_SEPARATOR) if name
+            ]
+        yield row
+
+
+READERS = {'ndjson': read_ndjson, 'csv': read_csv}
+
+
+def clean_record(raw):
+    """
+    Перевіряє запис полями моделей, повертає поля рецепта і назви
+    тегів та інгредієнтів
+    """
+    if not isinstance(raw, dict):
+        raise ValidationError('Invalid JSON object')
+    data = {}
+    for name in RECIPE_FIELDS:
+        field = Recipe._meta.get_field(name)
+        value = raw.get(name)
+        if value is None:
+            value = field.get_default()
+        data[name] = field.clean(value, None)
+    names = {}
+    for key, model, _, _ in RELATED:
+        field = model._meta.get_field('name')
+        names[key] = list(dict.fromkeys(
+            field.clean(item['name'] if isinstance(item, dict) else item,
+                        None)
+            for item in raw.get(key) or []
+        ))
+    return data, names
+
+
+def copy_rows(cursor, table, columns, rows):
+    """
+    Завантажує рядки в таблицю через COPY FROM STDIN
+    """
+    buffer = io.StringIO()
+    # рядки в лапках, тому порожній рядок не стає NULL
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN '
+        f'WITH (FORMAT csv)',
+        buffer,
+    )
+
+
+def load_batch(user, records, attr_ids):
+    """
+    Записує пачку рецептів з тегами і інгредієнтами в одній транзакції.
+    attr_ids - кеш назва -> id тегів і інгредієнтів користувача
+    """
+    with transaction.atomic():
+        for key, model, _, _ in RELATED:
+            missing = list(dict.fromkeys(
+                name for _, names in records for name in names[key]
+                if name not in attr_ids[key]
+            ))
+            attr_ids[key].update({
+                name: obj.id for name, obj in
+                get_or_create_attrs(model, user, missing).items()
+            })
+        with connection.cursor() as cursor:
+            # id резервуються наперед, бо COPY їх не повертає
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence('core_recipe', 'id')) "
+                "FROM generate_series(1, %s)", [len(records)])
+            recipe_ids = [row[0] for row in cursor.fetchall()]
+            # зв'язки пишуться до рецептів (зовнішні ключі Django
+            # перевіряються в кінці транзакції), тому тригер search_vector
+            # рахує вектор один раз при вставці рецепта, а не оновлює
+            # кожен рецепт після вставки зв'язків
+            for key, _, through, column in RELATED:
+                copy_rows(
+                    cursor, through._meta.db_table, ('recipe_id', column),
+                    [
+                        (recipe_id, attr_ids[key][name])
+                        for recipe_id, (_, names) in zip(recipe_ids, records)
+                        for name in names[key]
+                    ],
+                )
+            now = timezone.now()
+            copy_rows(
+                cursor, Recipe._meta.db_table,
+                ('id', 'user_id', *RECIPE_FIELDS, 'image', 'image_variants',
+                 'updated_at'),
+                [
+                    (recipe_id, user.id,
+                     *(data[name] for name in RECIPE_FIELDS), '', '{}', now)
+                    for recipe_id, (data, _) in zip(recipe_ids, records)
+                ],
+            )
+    # COPY не викликає сигналів моделей
+    bump_user_version(user.id)
+
+
+def read_checkpoint(path):
+    """
+    Кількість вже оброблених записів з файлу контрольної точки
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as checkpoint:
+        return int(checkpoint.read().strip() or 0)
+
+
+def write_checkpoint(path, count):
+    """
+    Атомарно записує кількість оброблених записів
+    """
+    if not path:
+        return
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as checkpoint:
+        checkpoint.write(str(count))
+    os.replace(tmp_path, path)
+
+
+class Command(BaseCommand):
+    """Джанго команда для швидкого імпорту рецептів з NDJSON або CSV"""
+    help = ('Imports recipes for one user from NDJSON or CSV (the export '
+            'format) using COPY in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Input file, "-" reads from stdin.')
+        parser.add_argument(
+            '--user', required=True, help='Email of the recipes owner.')
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Input format, by default taken from the file extension.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of records written per transaction.')
+        parser.add_argument(
+            '--checkpoint',
+            help='File with the number of processed records. The import '
+                 'resumes after it and updates it after every batch.')
+
+    def _open(self, path):
+        """Вхідний потік"""
+        if path == '-':
+            return sys.stdin
+        try:
+            return open(path, encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(error)
+
+    def handle(self, *args, **options):
+        """Старт команди"""
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["user"]} does not exist')
+        input_format = options['format'] or (
+            'csv' if options['path'].endswith('.csv') else 'ndjson')
+        batch_size = options['batch_size']
+        checkpoint = options['checkpoint']
+        done = read_checkpoint(checkpoint)
+        if done:
+            self.stdout.write(f'Resuming after {done} records')
+
+        attr_ids = {key: {} for key, _, _, _ in RELATED}
+        imported = skipped = 0
+        started = time.monotonic()
+        batch = []
+        number = done
+        stream = self._open(options['path'])
+        try:
+            records = READERS[input_format](stream)
+            for number, raw in enumerate(records, start=1):
+                if number <= done:
+                    continue
+                try:
+                    batch.append(clean_record(raw))
+                except (ValidationError, KeyError, TypeError) as error:
+                    skipped += 1
+                    messages = getattr(error, 'messages', [repr(error)])
+                    self.stderr.write(
+                        f'Record {number}: {"; ".join(messages)}')
+                # пачки рахуються по вхідних записах, щоб контрольна
+                # точка завжди вказувала на кінець записаної пачки
+                if (number - done) % batch_size == 0:
+                    imported += self._flush(user, batch, attr_ids)
+                    batch = []
+                    write_checkpoint(checkpoint, number)
+                    self._report(imported, skipped, started)
+            imported += self._flush(user, batch, attr_ids)
+            write_checkpoint(checkpoint, max(number, done))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self._report(imported, skipped, started)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes, skipped {skipped}'))
+
+    def _flush(self, user, batch, attr_ids):
+        """Записує пачку і повертає кількість рецептів"""
+        if batch:
+            load_batch(user, batch, attr_ids)
+        return len(batch)
+
+    def _report(self, imported, skipped, started):
+        """Прогрес і швидкість імпорту"""
+        elapsed = time.monotonic() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{imported} imported, {skipped} skipped, '
+            f'{rate:.0f} recipes/s')
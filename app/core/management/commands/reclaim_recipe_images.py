@@ -0,0 +1,104 @@
+"""
+Джанго команда яка видаляє файли зображень рецептів без посилань
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Recipe, StoredImage
+from core.storage import reclaim_image
+from recipe.variants import variant_paths
+
+
+def reclaim_batch(storage, released_before, cutoff, batch_size):
+    """
+    Видаляє пачку файлів без посилань разом з їх варіантами, повертає
+    кількість видалених і кількість переглянутих файлів
+    """
+    with transaction.atomic():
+        # заблокований рядок не дає тригеру повернути посилання, поки
+        # файл видаляється, тому новий рецепт не залишиться без файлу
+        images = list(StoredImage.objects.filter(
+            ref_count=0, released_at__lt=released_before,
+        ).order_by('released_at').select_for_update(
+            skip_locked=True)[:batch_size])
+        reclaimed = []
+        for image in images:
+            if not reclaim_image(storage, image.name, cutoff):
+                continue
+            for path in variant_paths(image.name):
+                storage.delete(path)
+            reclaimed.append(image.name)
+        StoredImage.objects.filter(pk__in=reclaimed).delete()
+        # файли, які знову почали використовувати, перевіряються наступного
+        # разу
+        StoredImage.objects.filter(
+            pk__in=[image.name for image in images],
+        ).exclude(pk__in=reclaimed).update(released_at=timezone.now())
+    return len(reclaimed), len(images)
+
+
+def orphan_files(storage, directory, cutoff):
+    """
+    Файли зображень без запису StoredImage, наприклад після відкоченої
+    транзакції, які не змінювались після cutoff
+    """
+    root = storage.path(directory)
+    for dirpath, dirnames, filenames in os.walk(root):
+        # варіанти видаляються разом з оригіналом
+        dirnames[:] = [name for name in dirnames if name != 'variants']
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, storage.location)
+            if (os.path.getmtime(path) < cutoff
+                    and not StoredImage.objects.filter(pk=name).exists()):
+                yield name
+
+
+class Command(BaseCommand):
+    """Джанго команда яка видаляє зображення без рецептів пачками"""
+    help = ('Deletes recipe image files (and their variants) that no '
+            'recipe has referenced for longer than the grace period.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.RECIPE_IMAGE_RECLAIM_GRACE,
+            help='Seconds a file must stay unreferenced before deletion.')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of files locked and deleted per transaction.')
+        parser.add_argument(
+            '--scan', action='store_true',
+            help='Also walk the image directory for files that were never '
+                 'referenced.')
+
+    def handle(self, *args, **options):
+        """Старт команди"""
+        storage = Recipe._meta.get_field('image').storage
+        started = timezone.now()
+        released_before = started - timedelta(seconds=options['grace'])
+        cutoff = time.time() - options['grace']
+        total = 0
+        while True:
+            reclaimed, seen = reclaim_batch(
+                storage, released_before, cutoff, options['batch_size'])
+            total += reclaimed
+            if seen < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(
+            f'Reclaimed {total} unreferenced images'))
+        if options['scan']:
+            orphans = 0
+            for name in orphan_files(
+                    storage, os.path.join('uploads', 'recipe'), cutoff):
+                if reclaim_image(storage, name, cutoff):
+                    for path in variant_paths(name):
+                        storage.delete(path)
+                    orphans += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'Reclaimed {orphans} orphaned files'))
@@ -0,0 +1,76 @@
+"""
+Джанго команда яка перераховує лічильники рецептів тегів і інгредієнтів
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import bump_user_version
+
+COUNTERS = (
+    (Tag, Recipe.tags.through, 'tag'),
+    (Ingredient, Recipe.ingredients.through, 'ingredient'),
+)
+
+
+def actual_recipe_count(through, field):
+    """
+    Підзапит з реальною кількістю рецептів для тегу чи інгредієнта
+    """
+    counts = through.objects.filter(
+        **{f'{field}_id': OuterRef('pk')}
+    ).order_by().values(f'{field}_id').annotate(
+        total=Count('recipe_id')).values('total')
+    return Coalesce(
+        Subquery(counts, output_field=IntegerField()), 0)
+
+
+def repair_batch(model, through, field, start_id, end_id):
+    """
+    Виправляє лічильники для id в [start_id, end_id), повертає кількість
+    виправлених рядків. Закешовані відповіді власників виправлених рядків
+    інвалідуються після коміту
+    """
+    with transaction.atomic():
+        # блокування рядків чекає на транзакції, що змінюють лічильники
+        ids = list(model.objects.filter(
+            pk__gte=start_id, pk__lt=end_id,
+        ).select_for_update().values_list('pk', flat=True))
+        if not ids:
+            return 0
+        wrong = dict(model.objects.filter(pk__in=ids).annotate(
+            actual=actual_recipe_count(through, field),
+        ).exclude(recipe_count=F('actual')).values_list('pk', 'user_id'))
+        if wrong:
+            model.objects.filter(pk__in=wrong).update(
+                recipe_count=actual_recipe_count(through, field))
+    # update() не викликає сигналів моделі
+    for user_id in set(wrong.values()):
+        bump_user_version(user_id)
+    return len(wrong)
+
+
+class Command(BaseCommand):
+    """Джанго команда яка перераховує лічильники рецептів пачками"""
+    help = 'Recomputes Tag.recipe_count and Ingredient.recipe_count.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of tags/ingredients locked and fixed per '
+                 'transaction.')
+
+    def handle(self, *args, **options):
+        """Старт команди"""
+        batch_size = options['batch_size']
+        for model, through, field in COUNTERS:
+            fixed = 0
+            last = model.objects.order_by('-pk').values_list(
+                'pk', flat=True).first() or 0
+            for start_id in range(1, last + 1, batch_size):
+                fixed += repair_batch(
+                    model, through, field, start_id, start_id + batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}: fixed {fixed} counters'))
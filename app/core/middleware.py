@@ -0,0 +1,169 @@
+"""
+Стиснення відповідей gzip і brotli з кешем стиснених байтів
+"""
+import gzip
+import hashlib
+import re
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSED_KEY = 'compressed:{encoding}:{digest}'
+# формати, які вже стиснені і майже не зменшуються
+COMPRESSED_CONTENT_TYPES = (
+    'image/', 'video/', 'audio/', 'font/woff', 'application/zip',
+    'application/gzip', 'application/x-gzip', 'application/octet-stream',
+    'application/pdf',
+)
+
+
+def gzip_compress(content):
+    """
+    Стискає байти gzip, mtime=0 робить результат однаковим для кешу
+    """
+    return gzip.compress(
+        content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def gzip_compress_stream(chunks):
+    """
+    Стискає потік gzip, віддаючи байти коли їх накопичив компресор
+    """
+    compressor = zlib.compressobj(
+        settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def brotli_compress(content):
+    """
+    Стискає байти brotli
+    """
+    return brotli.compress(
+        content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+
+def brotli_compress_stream(chunks):
+    """
+    Стискає потік brotli, віддаючи байти коли їх накопичив компресор
+    """
+    compressor = brotli.Compressor(
+        quality=settings.COMPRESSION_BROTLI_QUALITY)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+# кодування в порядку переваги: функція для байтів і для потоку
+ENCODINGS = (
+    ('br', brotli_compress, brotli_compress_stream),
+    ('gzip', gzip_compress, gzip_compress_stream),
+)
+
+
+def accepted_encodings(header):
+    """
+    Кодування з Accept-Encoding, крім заборонених через q=0
+    """
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        quality = re.search(r'q\s*=\s*([0-9.]+)', params)
+        try:
+            if quality and float(quality.group(1)) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Стискає відповіді brotli (якщо встановлений) або gzip, не менші за
+    COMPRESSION_MIN_SIZE. Стиснені байти відповідей з ETag кешуються,
+    тому повторний запит тієї ж версії не стискається заново
+    """
+
+    def _choose_encoding(self, request):
+        """
+        Найкраще кодування, яке приймає клієнт, або None
+        """
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding, compress, compress_stream in ENCODINGS:
+            if encoding == 'br' and brotli is None:
+                continue
+            if encoding in accepted or '*' in accepted:
+                return encoding, compress, compress_stream
+        return None
+
+    def _compress_cached(self, response, encoding, compress):
+        """
+        Стиснені байти з кешу за хешем тіла або стискає і кешує.
+        Кешуються тільки відповіді з ETag, які повторюються. Сам ETag
+        не є ключем: тіло з тим самим ETag може відрізнятись, наприклад
+        посиланнями на інший хост
+        """
+        if not response.has_header('ETag'):
+            return compress(response.content)
+        digest = hashlib.md5(response.content).hexdigest()
+        key = COMPRESSED_KEY.format(encoding=encoding, digest=digest)
+        cache = caches[settings.COMPRESSION_CACHE_ALIAS]
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = compress(response.content)
+            cache.set(key, compressed, settings.COMPRESSION_CACHE_TIMEOUT)
+        return compressed
+
+    def process_response(self, request, response):
+        """
+        Стискає відповідь, якщо це має сенс
+        """
+        content_type = response.get('Content-Type', '')
+        if (response.status_code == 206
+                or response.has_header('Content-Encoding')
+                or response.has_header('Content-Range')
+                or content_type.startswith(COMPRESSED_CONTENT_TYPES)):
+            return response
+        if (not response.streaming
+                and len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        chosen = self._choose_encoding(request)
+        if chosen is None:
+            return response
+        encoding, compress, compress_stream = chosen
+
+        if response.streaming:
+            # розмір потоку невідомий, тому він стискається завжди
+            response.streaming_content = compress_stream(
+                response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = self._compress_cached(
+                response, encoding, compress)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # стиснена відповідь - інше представлення, тому ETag слабкий
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не може виконуватись в транзакції
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_recipe_image'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'name'], name='ingredient_user_name_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name'], name='tag_user_name_idx'),
+        ),
+        # зворотний пошук рецептів по тегу/інгредієнту в автоматично
+        # створених проміжних таблицях
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+            'recipe_tags_tag_recipe_idx '
+            'ON core_recipe_tags (tag_id, recipe_id);',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS '
+                        'recipe_tags_tag_recipe_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+            'recipe_ingredients_ingr_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id);',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS '
+                        'recipe_ingredients_ingr_recipe_idx;',
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:45
+
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """
+    Об'єднує теги/інгредієнти з однаковою назвою у користувача, щоб
+    можна було додати обмеження унікальності
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    cases = [
+        (apps.get_model('core', 'Tag'), Recipe.tags.through, 'tag_id'),
+        (apps.get_model('core', 'Ingredient'),
+         Recipe.ingredients.through, 'ingredient_id'),
+    ]
+    for model, through, field in cases:
+        duplicates = model.objects.values('user_id', 'name').annotate(
+            keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+        for duplicate in duplicates:
+            keep_id = duplicate['keep_id']
+            drop_ids = list(model.objects.filter(
+                user_id=duplicate['user_id'], name=duplicate['name'],
+            ).exclude(id=keep_id).values_list('id', flat=True))
+            linked = set(through.objects.filter(
+                **{field: keep_id}).values_list('recipe_id', flat=True))
+            recipe_ids = set(through.objects.filter(
+                **{f'{field}__in': drop_ids}).values_list(
+                'recipe_id', flat=True)) - linked
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{field: keep_id})
+                for recipe_id in recipe_ids
+            ])
+            model.objects.filter(id__in=drop_ids).delete()
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не може виконуватись в транзакції
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_names,
+            migrations.RunPython.noop,
+            atomic=True,
+        ),
+        # унікальний індекс будується без блокування запису, а потім
+        # стає обмеженням; він замінює індекси (user_id, name)
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS '
+                    'ingredient_user_name_unique '
+                    'ON core_ingredient (user_id, name);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS '
+                                'ingredient_user_name_unique;',
+                ),
+                migrations.RunSQL(
+                    'ALTER TABLE core_ingredient '
+                    'ADD CONSTRAINT ingredient_user_name_unique '
+                    'UNIQUE USING INDEX ingredient_user_name_unique;',
+                    reverse_sql='ALTER TABLE core_ingredient '
+                                'DROP CONSTRAINT '
+                                'ingredient_user_name_unique;',
+                ),
+                migrations.RunSQL(
+                    'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS '
+                    'tag_user_name_unique '
+                    'ON core_tag (user_id, name);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS '
+                                'tag_user_name_unique;',
+                ),
+                migrations.RunSQL(
+                    'ALTER TABLE core_tag '
+                    'ADD CONSTRAINT tag_user_name_unique '
+                    'UNIQUE USING INDEX tag_user_name_unique;',
+                    reverse_sql='ALTER TABLE core_tag '
+                                'DROP CONSTRAINT tag_user_name_unique;',
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='ingredient',
+                    constraint=models.UniqueConstraint(fields=('user', 'name'), name='ingredient_user_name_unique'),
+                ),
+                migrations.AddConstraint(
+                    model_name='tag',
+                    constraint=models.UniqueConstraint(fields=('user', 'name'), name='tag_user_name_unique'),
+                ),
+            ],
+        ),
+        RemoveIndexConcurrently(
+            model_name='ingredient',
+            name='ingredient_user_name_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='tag',
+            name='tag_user_name_idx',
+        ),
+    ]
@@ -0,0 +1,140 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:51
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+# Вектор рецепта: назва (вага A), опис (B), теги і інгредієнти (C).
+# Конфігурація 'simple' не залежить від мови рецептів.
+RECIPE_SEARCH_VECTOR_SQL = """
+CREATE FUNCTION core_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce((
+            SELECT string_agg(t.name, ' ')
+            FROM core_recipe_tags rt JOIN core_tag t ON t.id = rt.tag_id
+            WHERE rt.recipe_id = NEW.id), '')), 'C')
+        || setweight(to_tsvector('simple', coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM core_recipe_ingredients ri
+            JOIN core_ingredient i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = NEW.id), '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+-- вектор перераховується тільки при зміні його джерел; зв'язки і
+-- перейменування скидають search_vector в NULL, що теж перераховує його
+CREATE TRIGGER recipe_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description, search_vector
+    ON core_recipe
+    FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_vector_update();
+
+-- зміна зв'язків перераховує вектори рецептів одним запитом на вставку
+CREATE FUNCTION core_recipe_search_vector_refresh() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE core_recipe SET search_vector = NULL
+        WHERE id IN (SELECT recipe_id FROM old_rows);
+    ELSE
+        UPDATE core_recipe SET search_vector = NULL
+        WHERE id IN (SELECT recipe_id FROM new_rows);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_tags_search_vector_insert
+    AFTER INSERT ON core_recipe_tags
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_vector_refresh();
+CREATE TRIGGER recipe_tags_search_vector_delete
+    AFTER DELETE ON core_recipe_tags
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_vector_refresh();
+CREATE TRIGGER recipe_ingredients_search_vector_insert
+    AFTER INSERT ON core_recipe_ingredients
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_vector_refresh();
+CREATE TRIGGER recipe_ingredients_search_vector_delete
+    AFTER DELETE ON core_recipe_ingredients
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE core_recipe_search_vector_refresh();
+
+-- перейменування тегу чи інгредієнта змінює вектори його рецептів
+CREATE FUNCTION core_tag_search_vector_refresh() RETURNS trigger AS $$
+BEGIN
+    UPDATE core_recipe SET search_vector = NULL WHERE id IN (
+        SELECT recipe_id FROM core_recipe_tags WHERE tag_id = NEW.id);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tag_search_vector_rename
+    AFTER UPDATE OF name ON core_tag
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE PROCEDURE core_tag_search_vector_refresh();
+
+CREATE FUNCTION core_ingredient_search_vector_refresh() RETURNS trigger AS $$
+BEGIN
+    UPDATE core_recipe SET search_vector = NULL WHERE id IN (
+        SELECT recipe_id FROM core_recipe_ingredients
+        WHERE ingredient_id = NEW.id);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER ingredient_search_vector_rename
+    AFTER UPDATE OF name ON core_ingredient
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE PROCEDURE core_ingredient_search_vector_refresh();
+"""
+
+DROP_RECIPE_SEARCH_VECTOR_SQL = """
+DROP TRIGGER IF EXISTS ingredient_search_vector_rename ON core_ingredient;
+DROP TRIGGER IF EXISTS tag_search_vector_rename ON core_tag;
+DROP TRIGGER IF EXISTS recipe_ingredients_search_vector_delete
+    ON core_recipe_ingredients;
+DROP TRIGGER IF EXISTS recipe_ingredients_search_vector_insert
+    ON core_recipe_ingredients;
+DROP TRIGGER IF EXISTS recipe_tags_search_vector_delete ON core_recipe_tags;
+DROP TRIGGER IF EXISTS recipe_tags_search_vector_insert ON core_recipe_tags;
+DROP TRIGGER IF EXISTS recipe_search_vector_update ON core_recipe;
+DROP FUNCTION IF EXISTS core_ingredient_search_vector_refresh();
+DROP FUNCTION IF EXISTS core_tag_search_vector_refresh();
+DROP FUNCTION IF EXISTS core_recipe_search_vector_refresh();
+DROP FUNCTION IF EXISTS core_recipe_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не може виконуватись в транзакції
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_unique_attr_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            RECIPE_SEARCH_VECTOR_SQL,
+            reverse_sql=DROP_RECIPE_SEARCH_VECTOR_SQL,
+        ),
+        # заповнення векторів для наявних рецептів через тригер
+        migrations.RunSQL(
+            'UPDATE core_recipe SET search_vector = NULL;',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# Лічильник змінюється одним UPDATE на інструкцію з проміжною таблицею,
+# тому він коректний і для bulk_create/видалення пачками. Рядки лічильників
+# блокуються в порядку id, щоб паралельні вставки не давали deadlock.
+RECIPE_COUNT_SQL = """
+CREATE FUNCTION core_{model}_recipe_count_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM 1 FROM core_{model} WHERE id IN (
+            SELECT {model}_id FROM new_rows) ORDER BY id FOR UPDATE;
+        UPDATE core_{model} a SET recipe_count = a.recipe_count + d.total
+        FROM (SELECT {model}_id, count(*) AS total FROM new_rows
+              GROUP BY {model}_id) d
+        WHERE a.id = d.{model}_id;
+    ELSE
+        PERFORM 1 FROM core_{model} WHERE id IN (
+            SELECT {model}_id FROM old_rows) ORDER BY id FOR UPDATE;
+        UPDATE core_{model} a
+        SET recipe_count = greatest(a.recipe_count - d.total, 0)
+        FROM (SELECT {model}_id, count(*) AS total FROM old_rows
+              GROUP BY {model}_id) d
+        WHERE a.id = d.{model}_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {through}_recipe_count_insert
+    AFTER INSERT ON core_{through}
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE core_{model}_recipe_count_update();
+CREATE TRIGGER {through}_recipe_count_delete
+    AFTER DELETE ON core_{through}
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE core_{model}_recipe_count_update();
+
+UPDATE core_{model} a SET recipe_count = d.total
+FROM (SELECT {model}_id, count(*) AS total FROM core_{through}
+      GROUP BY {model}_id) d
+WHERE a.id = d.{model}_id;
+"""
+
+DROP_RECIPE_COUNT_SQL = """
+DROP TRIGGER IF EXISTS {through}_recipe_count_delete ON core_{through};
+DROP TRIGGER IF EXISTS {through}_recipe_count_insert ON core_{through};
+DROP FUNCTION IF EXISTS core_{model}_recipe_count_update();
+"""
+
+
+def recipe_count_sql(model, through):
+    """
+    Тригери лічильника рецептів для тегу чи інгредієнта
+    """
+    return migrations.RunSQL(
+        RECIPE_COUNT_SQL.format(model=model, through=through),
+        reverse_sql=DROP_RECIPE_COUNT_SQL.format(
+            model=model, through=through),
+    )
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не може виконуватись в транзакції
+    atomic = False
+
+    dependencies = [
+        ('core', '0011_attr_name_trigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        recipe_count_sql('tag', 'recipe_tags'),
+        recipe_count_sql('ingredient', 'recipe_ingredients'),
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', '-name'], name='ingredient_user_assigned_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', '-name'], name='tag_user_assigned_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:36
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+# Лічильник змінюється тригером на рядок тільки коли змінюється зображення
+# рецепта, тому звичайні оновлення рецептів нічого не платять. Коли
+# посилань не лишається, released_at фіксує час для reclaim_recipe_images.
+IMAGE_REF_COUNT_SQL = """
+CREATE FUNCTION core_storedimage_ref_count_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND coalesce(OLD.image, '') <> '' THEN
+        UPDATE core_storedimage
+        SET ref_count = greatest(ref_count - 1, 0),
+            released_at = CASE WHEN ref_count <= 1 THEN now()
+                               ELSE released_at END
+        WHERE name = OLD.image;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND coalesce(NEW.image, '') <> '' THEN
+        INSERT INTO core_storedimage AS s (name, ref_count, released_at)
+        VALUES (NEW.image, 1, NULL)
+        ON CONFLICT (name) DO UPDATE
+        SET ref_count = s.ref_count + 1, released_at = NULL;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_image_ref_count_insert
+    AFTER INSERT ON core_recipe
+    FOR EACH ROW WHEN (coalesce(NEW.image, '') <> '')
+    EXECUTE PROCEDURE core_storedimage_ref_count_update();
+CREATE TRIGGER recipe_image_ref_count_update
+    AFTER UPDATE OF image ON core_recipe
+    FOR EACH ROW WHEN (OLD.image IS DISTINCT FROM NEW.image)
+    EXECUTE PROCEDURE core_storedimage_ref_count_update();
+CREATE TRIGGER recipe_image_ref_count_delete
+    AFTER DELETE ON core_recipe
+    FOR EACH ROW WHEN (coalesce(OLD.image, '') <> '')
+    EXECUTE PROCEDURE core_storedimage_ref_count_update();
+
+INSERT INTO core_storedimage (name, ref_count, released_at)
+SELECT image, count(*), NULL FROM core_recipe
+WHERE coalesce(image, '') <> ''
+GROUP BY image;
+"""
+
+DROP_IMAGE_REF_COUNT_SQL = """
+DROP TRIGGER IF EXISTS recipe_image_ref_count_delete ON core_recipe;
+DROP TRIGGER IF EXISTS recipe_image_ref_count_update ON core_recipe;
+DROP TRIGGER IF EXISTS recipe_image_ref_count_insert ON core_recipe;
+DROP FUNCTION IF EXISTS core_storedimage_ref_count_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('released_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.AddIndex(
+            model_name='storedimage',
+            index=models.Index(condition=models.Q(('ref_count', 0)), fields=['released_at'], name='storedimage_released_idx'),
+        ),
+        migrations.RunSQL(
+            IMAGE_REF_COUNT_SQL, reverse_sql=DROP_IMAGE_REF_COUNT_SQL),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:39
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не може виконуватись в транзакції
+    atomic = False
+
+    dependencies = [
+        ('core', '0014_stored_image'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'image'], name='recipe_user_image_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+    ]
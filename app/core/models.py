@@ -5,6 +5,8 @@ import uuid
 import os
 
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -12,6 +14,8 @@ from django.contrib.auth.models import (
     PermissionsMixin
 )
 
+from core.storage import recipe_image_storage
+
 
 def recipe_image_file_path(instance, filename):
     """
@@ -91,12 +95,59 @@ class Recipe(models.Model):
     # зв'язок з моделлю тегів
     ingredients = models.ManyToManyField('Ingredient')
     # зв'язок з моделлю інгредієнтів
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(null=True, upload_to=recipe_image_file_path,
+                              storage=recipe_image_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # зменшені копії зображення: назва -> шлях і розміри, заповнюються
+    # після генерації у фоні
+    updated_at = models.DateTimeField(auto_now=True)
+    # час останньої зміни рецепта, його тегів чи інгредієнтів
+    search_vector = SearchVectorField(null=True, editable=False)
+    # вектор для повнотекстового пошуку по назві, опису, тегах і
+    # інгредієнтах, підтримується тригерами бази даних
+
+    class Meta:
+        indexes = [
+            # список рецептів користувача відсортований по -id
+            models.Index(fields=['user', '-id'],
+                         name='recipe_user_id_desc_idx'),
+            GinIndex(fields=['search_vector'],
+                     name='recipe_search_vector_idx'),
+            # перевірка власника файлу зображення чи його варіанта за
+            # префіксом імені
+            models.Index(fields=['user', 'image'],
+                         name='recipe_user_image_idx',
+                         opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class StoredImage(models.Model):
+    """
+    Файл зображення і кількість рецептів, які на нього посилаються
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    # шлях файлу в сховищі, як у Recipe.image
+    ref_count = models.PositiveIntegerField(default=0)
+    # кількість рецептів з цим зображенням, підтримується тригерами бази
+    # даних
+    released_at = models.DateTimeField(null=True)
+    # коли зникло останнє посилання, файл видаляє reclaim_recipe_images
+
+    class Meta:
+        indexes = [
+            # файли без посилань для reclaim_recipe_images
+            models.Index(fields=['released_at'],
+                         condition=models.Q(ref_count=0),
+                         name='storedimage_released_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
 class Tag(models.Model):
     """
     Об'єкт тегу
@@ -109,6 +160,25 @@ class Tag(models.Model):
     name = models.CharField(max_length=255)
 
     # поле для назви тегу
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    # кількість рецептів з тегом, підтримується тригерами бази даних
+
+    class Meta:
+        constraints = [
+            # унікальна назва для користувача, індекс також використовується
+            # для списку тегів відсортованого по назві
+            models.UniqueConstraint(fields=['user', 'name'],
+                                    name='tag_user_name_unique'),
+        ]
+        indexes = [
+            # триграмний індекс для автодоповнення назв
+            GinIndex(fields=['name'], name='tag_name_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+            # список тегів, які використовуються в рецептах
+            models.Index(fields=['user', '-name'],
+                         condition=models.Q(recipe_count__gt=0),
+                         name='tag_user_assigned_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -120,10 +190,29 @@ class Ingredient(models.Model):
     """
     name = models.CharField(max_length=255)
     # поле для назви інгредієнта
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    # кількість рецептів з інгредієнтом, підтримується тригерами бази даних
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,  # зв'язок з моделлю користувача
         on_delete=models.CASCADE  # поведінка при видаленні користувача
     )
 
+    class Meta:
+        constraints = [
+            # унікальна назва для користувача, індекс також використовується
+            # для списку інгредієнтів відсортованого по назві
+            models.UniqueConstraint(fields=['user', 'name'],
+                                    name='ingredient_user_name_unique'),
+        ]
+        indexes = [
+            # триграмний індекс для автодоповнення назв
+            GinIndex(fields=['name'], name='ingredient_name_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+            # список інгредієнтів, які використовуються в рецептах
+            models.Index(fields=['user', '-name'],
+                         condition=models.Q(recipe_count__gt=0),
+                         name='ingredient_user_assigned_idx'),
+        ]
+
     def __str__(self):
         return self.name
@@ -0,0 +1,49 @@
+"""
+Парсери REST API: швидкий JSON на orjson і MessagePack
+"""
+import msgpack
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from core.renderers import FastJSONRenderer, MessagePackRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser, що розбирає тіло запиту через orjson, якщо він
+    встановлений і тіло в UTF-8
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Розбирає JSON тіло запиту
+        """
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        # orjson читає лише UTF-8 і завжди відкидає NaN та Infinity
+        if (orjson is None or not self.strict
+                or encoding.lower().replace('-', '') != 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(BaseParser):
+    """
+    Парсер тіла запиту у форматі MessagePack
+    """
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Розбирає MessagePack тіло запиту
+        """
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
@@ -0,0 +1,129 @@
+"""
+Рендерери REST API: швидкий JSON на orjson, MessagePack і зображення
+"""
+import msgpack
+from django.utils.cache import patch_vary_headers
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def vary_on_accept(renderer_context):
+    """
+    Формат відповіді залежить від Accept, тому кеші мають його враховувати
+    """
+    response = (renderer_context or {}).get('response')
+    if response is not None:
+        patch_vary_headers(response, ('Accept',))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer, що кодує відповідь через orjson, якщо він встановлений.
+    Типи, яких orjson не знає (Decimal, ліниві рядки), і дати кодуються
+    енкодером DRF, тому результат збігається з JSONRenderer байт в байт
+    """
+
+    def _use_stdlib(self, indent):
+        """
+        Випадки, які orjson не підтримує або форматує інакше
+        """
+        return (orjson is None or indent is not None or self.ensure_ascii
+                or not self.compact)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Рендерить дані у JSON байти
+        """
+        vary_on_accept(renderer_context)
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if self._use_stdlib(indent):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=(orjson.OPT_NON_STR_KEYS
+                        | orjson.OPT_PASSTHROUGH_DATETIME),
+            )
+        except orjson.JSONEncodeError:
+            # наприклад, цілі числа більші за 64 біти
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        # як і JSONRenderer, екрануємо \u2028 і \u2029
+        return ret.replace(
+            b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Рендерер компактного бінарного формату MessagePack. Типи, яких
+    msgpack не знає, кодуються енкодером DRF, тому після розбору дані
+    збігаються з JSON відповіддю
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Рендерить дані у MessagePack байти
+        """
+        vary_on_accept(renderer_context)
+        if data is None:
+            return b''
+        return msgpack.packb(
+            data, default=JSONEncoder().default, use_bin_type=True)
+
+
+class ImageRenderer(BaseRenderer):
+    """
+    Рендерер зображень для узгодження формату через Accept. Дія віддає
+    байти чи файл сама, а помилки (словник) рендеряться як JSON
+    """
+    charset = None
+    render_style = 'binary'
+    # формат Pillow і розширення файлу
+    pillow_format = None
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Повертає байти зображення, а помилку рендерить у JSON
+        """
+        vary_on_accept(renderer_context)
+        if data is None or isinstance(data, bytes):
+            return data or b''
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = FastJSONRenderer.media_type
+        return FastJSONRenderer().render(data)
+
+
+class JPEGRenderer(ImageRenderer):
+    """
+    Зображення JPEG
+    """
+    media_type = 'image/jpeg'
+    format = 'jpeg'
+    pillow_format = 'JPEG'
+    extension = '.jpg'
+
+
+class WebPRenderer(ImageRenderer):
+    """
+    Зображення WebP
+    """
+    media_type = 'image/webp'
+    format = 'webp'
+    pillow_format = 'WEBP'
+    extension = '.webp'
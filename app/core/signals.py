@@ -0,0 +1,61 @@
+"""
+Сигнали для підтримки денормалізованих даних моделей
+"""
+from django.db.models.signals import post_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+
+
+def touch_recipes(queryset):
+    """
+    Оновлює час зміни рецептів без виклику save()
+    """
+    queryset.update(updated_at=timezone.now())
+
+
+def _recipes_with(instance):
+    """
+    Рецепти, в яких використовується тег чи інгредієнт
+    """
+    if isinstance(instance, Tag):
+        return Recipe.objects.filter(tags=instance)
+    return Recipe.objects.filter(ingredients=instance)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_recipes_on_m2m_change(sender, instance, action, reverse,
+                                pk_set, **kwargs):
+    """
+    Оновлює час зміни рецептів при зміні їх тегів чи інгредієнтів
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_recipes(Recipe.objects.filter(pk=instance.pk))
+        return
+    # зворотна сторона: instance - тег чи інгредієнт, pk_set - рецепти
+    if action == 'pre_clear':
+        touch_recipes(_recipes_with(instance))
+    elif action in ('post_add', 'post_remove'):
+        touch_recipes(Recipe.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def touch_recipes_on_attr_save(sender, instance, created, **kwargs):
+    """
+    Оновлює час зміни рецептів при перейменуванні тегу чи інгредієнта
+    """
+    if not created:
+        touch_recipes(_recipes_with(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_on_attr_delete(sender, instance, **kwargs):
+    """
+    Оновлює час зміни рецептів перед видаленням тегу чи інгредієнта
+    """
+    touch_recipes(_recipes_with(instance))
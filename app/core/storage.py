@@ -0,0 +1,83 @@
+"""
+Сховище зображень, що адресує файли за хешем їх вмісту
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+
+def content_addressed_name(directory, digest, ext):
+    """
+    Шлях файлу за хешем вмісту, розкладений по двох рівнях підкаталогів,
+    щоб в одному каталозі не було надто багато файлів
+    """
+    return os.path.join(
+        directory, digest[:2], digest[2:4], f'{digest}{ext.lower()}')
+
+
+def file_digest(content):
+    """
+    sha256 вмісту файлу, читає його частинами
+    """
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Зберігає файл під ім'ям з sha256 його вмісту, якщо увімкнено
+    RECIPE_IMAGE_CONTENT_ADDRESSED. Однаковий вміст записується один раз,
+    а вміст за URL ніколи не змінюється
+    """
+
+    def _save(self, name, content):
+        """
+        Записує файл або повертає ім'я вже збереженого з тим самим вмістом
+        """
+        if not settings.RECIPE_IMAGE_CONTENT_ADDRESSED:
+            return super()._save(name, content)
+        directory, filename = os.path.split(name)
+        name = content_addressed_name(
+            directory, file_digest(content), os.path.splitext(filename)[1])
+        try:
+            # свіжий час зміни не дає reclaim_image видалити файл, який
+            # щойно знову почали використовувати
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        # пишемо у тимчасовий файл і атомарно перейменовуємо, тому
+        # паралельне завантаження того ж вмісту не бачить частковий файл
+        tmp_name = super()._save(f'{name}.tmp', content)
+        os.replace(self.path(tmp_name), self.path(name))
+        return name
+
+
+def reclaim_image(storage, name, cutoff):
+    """
+    Видаляє файл, який не змінювався і не використовувався повторно
+    після cutoff (timestamp). Повертає True, якщо файл видалено або його
+    вже немає
+    """
+    path = storage.path(name)
+    reclaimed = f'{path}.reclaim'
+    try:
+        # після перейменування ContentAddressedStorage вже не знайде файл
+        # і запише новий, тому перевірка часу нижче не має гонки
+        os.rename(path, reclaimed)
+    except FileNotFoundError:
+        return True
+    if os.stat(reclaimed).st_mtime > cutoff:
+        os.replace(reclaimed, path)
+        return False
+    os.remove(reclaimed)
+    return True
+
+
+recipe_image_storage = ContentAddressedStorage()
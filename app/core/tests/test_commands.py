@@ -1,11 +1,25 @@
 """
 Тест для кастомних команд Django
 """
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Recipe, StoredImage, Tag, Ingredient
+from recipe.cache import get_user_version
+from recipe.variants import variant_paths
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -30,3 +44,197 @@ class CommandTests(SimpleTestCase):
         self.assertEqual(patched_check.call_count, 6)
         # Перевіряємо чи була викликана команда check 6 разів
         patched_check.assert_called_with(databases=['default'])
+
+
+class RepairRecipeCountsTests(TestCase):
+    """Тест для команди перерахунку лічильників рецептів"""
+    def test_repair_recipe_counts(self):
+        """Тест: зіпсовані лічильники виправляються пачками"""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        tags = [Tag.objects.create(user=user, name=f'Tag {i}')
+                for i in range(3)]
+        ingredient = Ingredient.objects.create(user=user, name='Salt')
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('5.00'))
+        recipe.tags.add(tags[0], tags[1])
+        recipe.ingredients.add(ingredient)
+        Tag.objects.update(recipe_count=7)
+        Ingredient.objects.update(recipe_count=0)
+
+        out = StringIO()
+        call_command('repair_recipe_counts', batch_size=2, stdout=out)
+
+        counts = dict(Tag.objects.values_list('name', 'recipe_count'))
+        self.assertEqual(counts, {'Tag 0': 1, 'Tag 1': 1, 'Tag 2': 0})
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.recipe_count, 1)
+        self.assertIn('Tag: fixed 3 counters', out.getvalue())
+        self.assertIn('Ingredient: fixed 1 counters', out.getvalue())
+
+    def test_repair_invalidates_cache(self):
+        """Тест: виправлення лічильника інвалідує кеш власника"""
+        user, other = (
+            get_user_model().objects.create_user(email, 'testpass123')
+            for email in ('user@example.com', 'other@example.com'))
+        Tag.objects.create(user=user, name='Dinner')
+        Tag.objects.create(user=other, name='Lunch')
+        Tag.objects.filter(user=user).update(recipe_count=3)
+        version = get_user_version(user.pk)
+        other_version = get_user_version(other.pk)
+
+        call_command('repair_recipe_counts', stdout=StringIO())
+
+        self.assertNotEqual(get_user_version(user.pk), version)
+        self.assertEqual(get_user_version(other.pk), other_version)
+
+
+class ImportRecipesTests(TestCase):
+    """Тест для команди імпорту рецептів"""
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _write(self, name, lines):
+        """Файл з вхідними даними"""
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write('\n'.join(lines) + '\n')
+        return path
+
+    def _records(self, count):
+        """Рядки NDJSON з рецептами"""
+        return [json.dumps({
+            'title': f'Recipe {i}',
+            'time_minutes': 10,
+            'price': '5.50',
+            'tags': [{'name': 'Dinner'}, {'name': f'Tag {i % 2}'}],
+            'ingredients': ['Salt'],
+        }) for i in range(count)]
+
+    def test_import_ndjson(self):
+        """Тест: рецепти, теги, інгредієнти і зв'язки імпортуються"""
+        Tag.objects.create(user=self.user, name='Dinner')
+        lines = self._records(3) + ['{"title": "No price"}', 'not json']
+        path = self._write('recipes.ndjson', lines)
+
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', path, user=self.user.email,
+                     batch_size=2, stdout=out, stderr=err)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(
+            [recipe.title for recipe in recipes],
+            ['Recipe 0', 'Recipe 1', 'Recipe 2'])
+        self.assertEqual(recipes[0].price, Decimal('5.50'))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            Tag.objects.get(user=self.user, name='Dinner').recipe_count, 3)
+        self.assertEqual(
+            list(recipes[1].ingredients.values_list('name', flat=True)),
+            ['Salt'])
+        self.assertIn('Imported 3 recipes, skipped 2', out.getvalue())
+        self.assertIn('Record 4', err.getvalue())
+        self.assertIn('Record 5', err.getvalue())
+
+    def test_import_resumes_from_checkpoint(self):
+        """Тест: імпорт продовжується після контрольної точки"""
+        path = self._write('recipes.ndjson', self._records(5))
+        checkpoint = os.path.join(self.tmpdir.name, 'checkpoint')
+        with open(checkpoint, 'w') as stream:
+            stream.write('3')
+
+        call_command('import_recipes', path, user=self.user.email,
+                     checkpoint=checkpoint, stdout=StringIO())
+
+        titles = Recipe.objects.values_list('title', flat=True)
+        self.assertEqual(sorted(titles), ['Recipe 3', 'Recipe 4'])
+        with open(checkpoint) as stream:
+            self.assertEqual(stream.read(), '5')
+
+    def test_import_csv_export_format(self):
+        """Тест: імпорт CSV у форматі експорту"""
+        path = self._write('recipes.csv', [
+            'id,title,description,time_minutes,price,link,image,tags,'
+            'ingredients',
+            '1,Borscht,Beet soup,90,7.00,,,Soup;Dinner,Beet;Salt',
+        ])
+
+        call_command('import_recipes', path, user=self.user.email,
+                     stdout=StringIO())
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.description, 'Beet soup')
+        self.assertEqual(recipe.link, '')
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Dinner', 'Soup'])
+        self.assertEqual(recipe.ingredients.count(), 2)
+
+
+class ReclaimRecipeImagesTests(TestCase):
+    """Тест для команди видалення зображень без рецептів"""
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        media = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def _recipe(self, content):
+        """Рецепт із зображенням з вказаним вмістом"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('5.00'))
+        recipe.image.save('image.jpg', ContentFile(content))
+        return recipe
+
+    def test_reclaim_unreferenced_images(self):
+        """Тест: видаляється тільки файл без рецептів разом з варіантами"""
+        shared = [self._recipe(b'shared') for _ in range(2)]
+        replaced = self._recipe(b'replaced')
+        old_name = replaced.image.name
+        variants = variant_paths(old_name)
+        for path in variants:
+            default_storage.save(path, ContentFile(b'variant'))
+        replaced.image.save('image.jpg', ContentFile(b'new'))
+        shared[0].delete()
+        StoredImage.objects.update(
+            released_at=timezone.now() - timedelta(hours=2))
+        out = StringIO()
+        call_command('reclaim_recipe_images', grace=0, stdout=out)
+
+        self.assertFalse(default_storage.exists(old_name))
+        for path in variants:
+            self.assertFalse(default_storage.exists(path))
+        self.assertTrue(default_storage.exists(shared[1].image.name))
+        self.assertTrue(default_storage.exists(replaced.image.name))
+        self.assertFalse(StoredImage.objects.filter(pk=old_name).exists())
+        self.assertIn('Reclaimed 1 unreferenced images', out.getvalue())
+
+    def test_grace_period(self):
+        """Тест: нещодавно звільнений файл не видаляється"""
+        recipe = self._recipe(b'image')
+        name = recipe.image.name
+        recipe.delete()
+        call_command('reclaim_recipe_images', stdout=StringIO())
+
+        self.assertTrue(default_storage.exists(name))
+        self.assertTrue(StoredImage.objects.filter(pk=name).exists())
+
+    def test_scan_orphaned_files(self):
+        """Тест: --scan видаляє старі файли, на які ніколи не посилались"""
+        name = default_storage.save(
+            'uploads/recipe/ab/cd/orphan.jpg', ContentFile(b'orphan'))
+        recipe = self._recipe(b'image')
+        out = StringIO()
+        call_command('reclaim_recipe_images', grace=0, scan=True,
+                     stdout=out)
+
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(recipe.image.name))
+        self.assertIn('Reclaimed 1 orphaned files', out.getvalue())
@@ -0,0 +1,157 @@
+"""
+Тести стиснення відповідей
+"""
+import gzip
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.middleware import CompressionMiddleware, brotli
+
+CONTENT = b'{"title": "Sample recipe"}' * 100
+
+
+def run_middleware(response, accept_encoding='gzip, br'):
+    """
+    Пропускає відповідь через CompressionMiddleware
+    """
+    request = RequestFactory().get(
+        '/api/recipe/recipes/', HTTP_ACCEPT_ENCODING=accept_encoding)
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+def json_response(content=CONTENT, **headers):
+    """
+    JSON відповідь з заголовками
+    """
+    response = HttpResponse(content, content_type='application/json')
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+@patch('core.middleware.brotli', None)
+class CompressionMiddlewareTests(TestCase):
+    """
+    Тести CompressionMiddleware
+    """
+
+    def setUp(self):
+        caches[settings.COMPRESSION_CACHE_ALIAS].clear()
+
+    def test_gzip_response(self):
+        """
+        Тест що відповідь стискається gzip
+        """
+        response = run_middleware(json_response())
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), CONTENT)
+        self.assertEqual(
+            response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    @override_settings(COMPRESSION_MIN_SIZE=len(CONTENT) + 1)
+    def test_small_response_not_compressed(self):
+        """
+        Тест що відповідь менша за поріг не стискається
+        """
+        response = run_middleware(json_response())
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, CONTENT)
+
+    def test_not_accepted_encoding(self):
+        """
+        Тест що без gzip в Accept-Encoding відповідь не стискається
+        """
+        for accept_encoding in ('', 'identity', 'gzip;q=0'):
+            response = run_middleware(json_response(), accept_encoding)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response.content, CONTENT)
+
+    def test_compressed_media_skipped(self):
+        """
+        Тест що вже стиснені формати не стискаються
+        """
+        response = HttpResponse(CONTENT, content_type='image/jpeg')
+        response = run_middleware(response)
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, CONTENT)
+
+    def test_partial_content_skipped(self):
+        """
+        Тест що частина файлу (206) не стискається
+        """
+        response = json_response()
+        response.status_code = 206
+        response = run_middleware(response)
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, CONTENT)
+
+    def test_streaming_response(self):
+        """
+        Тест що потокова відповідь стискається без Content-Length
+        """
+        response = StreamingHttpResponse(
+            (b'{"id": %d}\n' % i for i in range(1000)),
+            content_type='application/x-ndjson')
+        response = run_middleware(response)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            b''.join(b'{"id": %d}\n' % i for i in range(1000)))
+
+    def test_etag_becomes_weak(self):
+        """
+        Тест що ETag стисненої відповіді стає слабким
+        """
+        response = run_middleware(json_response(ETag='"abc"'))
+
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+    def test_compressed_bytes_reused_by_content(self):
+        """
+        Тест що стиснені байти того самого тіла беруться з кешу
+        """
+        first = run_middleware(json_response(ETag='"abc"'))
+        with patch('core.middleware.gzip.compress',
+                   wraps=gzip.compress) as compress:
+            second = run_middleware(json_response(ETag='"def"'))
+            self.assertEqual(compress.call_count, 0)
+
+        self.assertEqual(second.content, first.content)
+
+    def test_same_etag_different_content_not_reused(self):
+        """
+        Тест що інше тіло з тим самим ETag стискається заново
+        """
+        run_middleware(json_response(ETag='"abc"'))
+        content = CONTENT.replace(b'Sample', b'Other')
+        response = run_middleware(json_response(content, ETag='"abc"'))
+
+        self.assertEqual(gzip.decompress(response.content), content)
+
+
+@skipIf(brotli is None, 'brotli is not installed')
+class BrotliCompressionTests(TestCase):
+    """
+    Тести стиснення brotli
+    """
+
+    def test_brotli_preferred(self):
+        """
+        Тест що brotli має перевагу над gzip
+        """
+        response = run_middleware(json_response())
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), CONTENT)
@@ -1,12 +1,19 @@
 """
 Тест для моделей
 """
+import os
+import tempfile
+import time
 from unittest.mock import patch
 from decimal import Decimal
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction, IntegrityError
 
 from core import models
+from core.storage import ContentAddressedStorage, reclaim_image
+from recipe.autocomplete import autocomplete_queryset
 
 
 def create_user(email='user@example.com', password='testpass123'):
@@ -112,6 +119,49 @@ class ModelTests(TestCase):
         )
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_tag_and_ingredient_names_unique_per_user(self):
+        """
+        Тест: назва тегу чи інгредієнта унікальна для користувача
+        """
+        user = create_user()
+        other_user = create_user(email='other@example.com')
+        for model in (models.Tag, models.Ingredient):
+            model.objects.create(user=user, name='Salt')
+            model.objects.create(user=other_user, name='Salt')
+            with self.assertRaises(IntegrityError):
+                with transaction.atomic():
+                    model.objects.create(user=user, name='Salt')
+
+    def test_recipe_count_follows_recipe_links(self):
+        """
+        Тест: лічильник рецептів змінюється при додаванні, видаленні і
+        очищенні зв'язків, масових вставках і видаленні рецептів
+        """
+        user = create_user()
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+        recipes = [
+            models.Recipe.objects.create(
+                user=user, title=f'Recipe {i}', time_minutes=5,
+                price=Decimal('5.50'))
+            for i in range(4)
+        ]
+        counts = []
+        recipes[0].tags.add(tag)
+        through = models.Recipe.tags.through
+        through.objects.bulk_create([
+            through(recipe=recipe, tag=tag) for recipe in recipes[1:]
+        ])
+        tag.refresh_from_db()
+        counts.append(tag.recipe_count)
+        recipes[0].tags.remove(tag)
+        recipes[1].tags.clear()
+        tag.refresh_from_db()
+        counts.append(tag.recipe_count)
+        models.Recipe.objects.filter(user=user).delete()
+        tag.refresh_from_db()
+        counts.append(tag.recipe_count)
+        self.assertEqual(counts, [4, 2, 0])
+
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
         """
@@ -122,3 +172,175 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, 'myimage.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+    def test_stored_image_ref_count(self):
+        """
+        Тест що тригери рахують рецепти з однаковим зображенням
+        """
+        user = create_user()
+        recipes = [models.Recipe.objects.create(
+            user=user, title=f'Recipe {i}', time_minutes=5,
+            price=Decimal('5.00'), image='uploads/recipe/a.jpg')
+            for i in range(3)]
+
+        def ref_count(name):
+            return models.StoredImage.objects.get(pk=name).ref_count
+
+        self.assertEqual(ref_count('uploads/recipe/a.jpg'), 3)
+        recipes[0].image = 'uploads/recipe/b.jpg'
+        recipes[0].save()
+        recipes[1].title = 'Renamed'
+        recipes[1].save()
+        self.assertEqual(ref_count('uploads/recipe/a.jpg'), 2)
+        self.assertEqual(ref_count('uploads/recipe/b.jpg'), 1)
+        models.Recipe.objects.filter(image='uploads/recipe/a.jpg').delete()
+        image = models.StoredImage.objects.get(pk='uploads/recipe/a.jpg')
+        self.assertEqual(image.ref_count, 0)
+        self.assertIsNotNone(image.released_at)
+        recipes[0].image = 'uploads/recipe/a.jpg'
+        recipes[0].save()
+        image.refresh_from_db()
+        self.assertEqual(image.ref_count, 1)
+        self.assertIsNone(image.released_at)
+
+
+class ContentAddressedStorageTests(TestCase):
+    """
+    Тести сховища зображень за хешем вмісту
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_same_content_stored_once(self):
+        """
+        Тест що однаковий вміст зберігається в один файл за його хешем
+        """
+        first = self.storage.save(
+            'uploads/recipe/one.JPG', ContentFile(b'image'))
+        second = self.storage.save(
+            'uploads/recipe/two.jpg', ContentFile(b'image'))
+        other = self.storage.save(
+            'uploads/recipe/three.jpg', ContentFile(b'other'))
+
+        digest = ('6105d6cc76af400325e94d588ce511be'
+                  '5bfdbb73b437dc51eca43917d7a43e3d')
+        self.assertEqual(
+            first, f'uploads/recipe/61/05/{digest}.jpg')
+        self.assertEqual(second, first)
+        self.assertNotEqual(other, first)
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.storage.path(first))),
+            [os.path.basename(first)])
+
+    @override_settings(RECIPE_IMAGE_CONTENT_ADDRESSED=False)
+    def test_content_addressing_disabled(self):
+        """
+        Тест що без RECIPE_IMAGE_CONTENT_ADDRESSED ім'я не змінюється
+        """
+        name = self.storage.save(
+            'uploads/recipe/one.jpg', ContentFile(b'image'))
+
+        self.assertEqual(name, 'uploads/recipe/one.jpg')
+
+    def test_reclaim_image(self):
+        """
+        Тест що файл, використаний після cutoff, не видаляється
+        """
+        name = self.storage.save(
+            'uploads/recipe/one.jpg', ContentFile(b'image'))
+        cutoff = time.time() - 60
+        os.utime(self.storage.path(name), (cutoff - 60, cutoff - 60))
+        self.storage.save('uploads/recipe/two.jpg', ContentFile(b'image'))
+
+        self.assertFalse(reclaim_image(self.storage, name, cutoff))
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(reclaim_image(self.storage, name, time.time() + 1))
+        self.assertFalse(self.storage.exists(name))
+
+
+class IndexTests(TestCase):
+    """
+    Тести для перевірки що запити апі використовують індекси
+    """
+
+    def setUp(self):
+        self.user = create_user()
+        with connection.cursor() as cursor:
+            # на порожніх таблицях планувальник обирає seq/bitmap scan
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+
+    def test_recipe_list_uses_user_id_index(self):
+        """
+        Тест: список рецептів користувача йде по індексу (user, -id)
+        """
+        plan = models.Recipe.objects.filter(
+            user=self.user).order_by('-id').explain()
+        self.assertIn('recipe_user_id_desc_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_tag_and_ingredient_lists_use_user_name_index(self):
+        """
+        Тест: списки тегів і інгредієнтів йдуть по індексу (user, name)
+        """
+        cases = [
+            (models.Tag, 'tag_user_name_unique'),
+            (models.Ingredient, 'ingredient_user_name_unique'),
+        ]
+        for model, index_name in cases:
+            plan = model.objects.filter(
+                user=self.user).order_by('-name').explain()
+            self.assertIn(index_name, plan)
+            self.assertNotIn('Sort', plan)
+
+    def test_through_tables_reverse_lookup_index(self):
+        """
+        Тест: пошук рецептів по тегу/інгредієнту йде по індексу
+        проміжної таблиці (tag_id, recipe_id)
+        """
+        cases = [
+            (models.Recipe.tags.through, 'tag_id',
+             'recipe_tags_tag_recipe_idx'),
+            (models.Recipe.ingredients.through, 'ingredient_id',
+             'recipe_ingredients_ingr_recipe_idx'),
+        ]
+        for through, field, index_name in cases:
+            plan = through.objects.filter(
+                **{f'{field}__in': [1, 2]}).values('recipe_id').explain()
+            self.assertIn(index_name, plan)
+
+    def test_autocomplete_uses_trigram_index(self):
+        """
+        Тест: пошук назви по префіксу і схожості йде по триграмному
+        індексу
+        """
+        with connection.cursor() as cursor:
+            # GIN індекс читається тільки через bitmap scan
+            cursor.execute('SET LOCAL enable_bitmapscan = on')
+        cases = [
+            (models.Tag, 'tag_name_trgm_idx'),
+            (models.Ingredient, 'ingredient_name_trgm_idx'),
+        ]
+        for model, index_name in cases:
+            plan = autocomplete_queryset(
+                model.objects.all(), 'garlic').explain()
+            self.assertIn(index_name, plan)
+
+    def test_assigned_only_uses_partial_index(self):
+        """
+        Тест: фільтр assigned_only йде по частковому індексу лічильника
+        """
+        cases = [
+            (models.Tag, 'tag_user_assigned_idx'),
+            (models.Ingredient, 'ingredient_user_assigned_idx'),
+        ]
+        for model, index_name in cases:
+            plan = model.objects.filter(
+                user=self.user, recipe_count__gt=0).order_by('-name').explain()
+            self.assertIn(index_name, plan)
+            self.assertNotIn('Sort', plan)
@@ -0,0 +1,131 @@
+"""
+Тести рендерерів і парсерів REST API
+"""
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+import msgpack
+from django.test import TestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import FastJSONParser, MessagePackParser
+from core.renderers import FastJSONRenderer, MessagePackRenderer
+
+SAMPLE_DATA = {
+    'id': 1,
+    'title': 'Борщ\u2028',
+    'price': Decimal('5.50'),
+    'image': 'http://testserver/media/uploads/recipe/'
+             f'{uuid.UUID(int=1)}.jpg',
+    'uuid': uuid.UUID(int=2),
+    'label': gettext_lazy('Recipes'),
+    'created': datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc),
+    'tags': [{'id': 1, 'name': 'Vegan'}],
+    7: None,
+}
+
+
+class FastJSONRendererTests(TestCase):
+    """
+    Тести FastJSONRenderer
+    """
+
+    def test_render_matches_json_renderer(self):
+        """
+        Тест що результат збігається з JSONRenderer байт в байт
+        """
+        self.assertEqual(
+            FastJSONRenderer().render(SAMPLE_DATA),
+            JSONRenderer().render(SAMPLE_DATA),
+        )
+
+    def test_render_indent_matches_json_renderer(self):
+        """
+        Тест що форматований вивід збігається з JSONRenderer
+        """
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            FastJSONRenderer().render(SAMPLE_DATA, media_type),
+            JSONRenderer().render(SAMPLE_DATA, media_type),
+        )
+
+    def test_render_without_orjson(self):
+        """
+        Тест що без orjson використовується стандартний json
+        """
+        with patch('core.renderers.orjson', None):
+            rendered = FastJSONRenderer().render(SAMPLE_DATA)
+        self.assertEqual(rendered, JSONRenderer().render(SAMPLE_DATA))
+
+    def test_render_big_integer(self):
+        """
+        Тест що ціле число більше за 64 біти рендериться як у JSONRenderer
+        """
+        data = {'value': 2 ** 70}
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class FastJSONParserTests(TestCase):
+    """
+    Тести FastJSONParser
+    """
+
+    def test_parse_matches_json_parser(self):
+        """
+        Тест що розбір збігається з JSONParser
+        """
+        body = '{"title": "Борщ", "price": 5.5, "tags": [{"name": "a"}]}'
+        self.assertEqual(
+            FastJSONParser().parse(io.BytesIO(body.encode())),
+            JSONParser().parse(io.BytesIO(body.encode())),
+        )
+
+    def test_parse_invalid_json(self):
+        """
+        Тест що некоректний JSON дає ParseError
+        """
+        for body in (b'{"title": ', b'NaN'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+
+class MessagePackTests(TestCase):
+    """
+    Тести MessagePackRenderer і MessagePackParser
+    """
+
+    def test_render_matches_json(self):
+        """
+        Тест що розібраний MessagePack збігається з розібраним JSON
+        """
+        data = dict(SAMPLE_DATA)
+        del data[7]
+        self.assertEqual(
+            msgpack.unpackb(MessagePackRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
+
+    def test_parse_roundtrip(self):
+        """
+        Тест що парсер читає результат рендерера
+        """
+        data = {'title': 'Борщ', 'tags': [{'name': 'a'}], 'price': '5.50'}
+        rendered = MessagePackRenderer().render(data)
+        self.assertEqual(
+            MessagePackParser().parse(io.BytesIO(rendered)), data)
+
+    def test_parse_invalid(self):
+        """
+        Тест що некоректний MessagePack дає ParseError
+        """
+        for body in (b'\xc1', b'\x92\x01', b'\x01\x02'):
+            with self.assertRaises(ParseError):
+                MessagePackParser().parse(io.BytesIO(body))
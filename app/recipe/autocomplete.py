@@ -0,0 +1,158 @@
+"""
+Автодоповнення назв тегів і інгредієнтів
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import OperationalError, connection, transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from drf_spectacular.utils import extend_schema, OpenApiParameter, \
+    OpenApiTypes
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from recipe.cache import get_user_version
+
+
+class LRUCache:
+    """
+    Невеликий потокобезпечний LRU кеш в пам'яті процесу
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Значення по ключу або None, ключ стає останнім використаним
+        """
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        """
+        Зберігає значення, витісняючи найдавніше використані ключі
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        Очищає кеш
+        """
+        with self._lock:
+            self._data.clear()
+
+
+autocomplete_cache = LRUCache(settings.RECIPE_AUTOCOMPLETE_LRU_SIZE)
+
+
+def autocomplete_queryset(queryset, term):
+    """
+    Назви, що починаються з term або схожі на нього по триграмах.
+    Спочатку збіги по префіксу, далі по схожості
+    """
+    is_prefix = ExpressionWrapper(
+        Q(name__istartswith=term), output_field=BooleanField())
+    # ~* і % обслуговуються триграмним GIN індексом, на відміну від
+    # UPPER(name) LIKE, який генерує istartswith
+    return queryset.filter(
+        Q(name__iregex=r'^' + re.escape(term)) |
+        Q(name__trigram_similar=term)
+    ).annotate(
+        is_prefix=is_prefix,
+        similarity=TrigramSimilarity('name', term),
+    ).order_by('-is_prefix', '-similarity', 'name')
+
+
+class AutocompleteMixin:
+    """
+    Дія autocomplete для вью тегів і інгредієнтів
+    """
+
+    def _get_autocomplete_limit(self):
+        """
+        Кількість результатів з параметра limit в межах налаштувань
+        """
+        try:
+            limit = int(self.request.query_params.get('limit', ''))
+        except ValueError:
+            return settings.RECIPE_AUTOCOMPLETE_LIMIT
+        return max(1, min(limit, settings.RECIPE_AUTOCOMPLETE_MAX_LIMIT))
+
+    def _find_matches(self, term, limit):
+        """
+        Шукає збіги з обмеженням часу запиту. Якщо ліміт перевищено,
+        повертає None замість того щоб тримати запит
+        """
+        queryset = autocomplete_queryset(
+            self.queryset.filter(user=self.request.user), term)
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SET LOCAL statement_timeout = %s',
+                        [settings.RECIPE_AUTOCOMPLETE_TIMEOUT_MS])
+                return list(queryset[:limit])
+        except OperationalError:
+            return None
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description='Початок або частина назви', ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Максимальна кількість результатів', ),
+        ]
+    )
+    @action(methods=['GET'], detail=False, url_path='autocomplete',
+            pagination_class=None)
+    def autocomplete(self, request):
+        """
+        Підказки назв для поточного користувача
+        """
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            return Response([])
+        limit = self._get_autocomplete_limit()
+        # версія даних користувача змінюється при зміні його тегів і
+        # інгредієнтів, тому старі записи LRU просто перестають читатись
+        key = (
+            self.queryset.model._meta.label,
+            request.user.pk,
+            get_user_version(request.user.pk),
+            term.lower(),
+            limit,
+        )
+        data = autocomplete_cache.get(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        matches = self._find_matches(term, limit)
+        if matches is None:
+            response = Response([])
+            response['X-Autocomplete-Timeout'] = '1'
+            return response
+        data = list(self.get_serializer(matches, many=True).data)
+        autocomplete_cache.set(key, data)
+        response = Response(data)
+        response['X-Cache'] = 'MISS'
+        return response
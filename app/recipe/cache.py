@@ -0,0 +1,144 @@
+"""
+Кеш відповідей апі рецептів з версією даних для кожного користувача
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+VERSION_KEY = 'recipe:version:{user_id}'
+RESPONSE_KEY = 'recipe:response:{user_id}:{version}:{digest}'
+STATS_KEY = 'recipe:stats:{name}'
+
+
+def get_cache():
+    """
+    Повертає кеш для відповідей апі
+    """
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def get_user_version(user_id):
+    """
+    Повертає поточну версію даних користувача
+    """
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # версія з часу не збігається з версіями витіснених з кешу ключів
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_version(user_id):
+    """
+    Збільшує версію даних користувача, що робить неактуальними
+    всі його закешовані відповіді
+    """
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def incr_stat(key):
+    """
+    Збільшує лічильник статистики з ключем key
+    """
+    cache = get_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_cache_stats():
+    """
+    Повертає кількість попадань і промахів кешу відповідей
+    """
+    cache = get_cache()
+    return {
+        name: cache.get(STATS_KEY.format(name=name), 0)
+        for name in ('hits', 'misses')
+    }
+
+
+def reset_cache_stats():
+    """
+    Обнуляє лічильники кешу відповідей
+    """
+    get_cache().delete_many(
+        [STATS_KEY.format(name=name) for name in ('hits', 'misses')])
+
+
+def get_response_key(request, view_name):
+    """
+    Ключ відповіді: користувач, версія його даних, вью, схема, хост,
+    шлях і відсортовані параметри запиту. Відповіді містять абсолютні
+    посилання (зображення, курсори), тому схема і хост входять в ключ
+    """
+    params = sorted(
+        (key, sorted(values))
+        for key, values in request.query_params.lists()
+    )
+    digest = hashlib.md5(repr((
+        view_name, request.scheme, request.get_host(), request.path, params,
+    )).encode()).hexdigest()
+    return RESPONSE_KEY.format(
+        user_id=request.user.pk,
+        version=get_user_version(request.user.pk),
+        digest=digest,
+    )
+
+
+class CachedResponseMixin:
+    """
+    Кешує відповіді на читання для поточного користувача
+    """
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        """
+        Повертає відповідь з кешу або викликає handler і кешує результат
+        """
+        cache = get_cache()
+        key = get_response_key(
+            request, f'{self.__class__.__name__}.{self.action}')
+        data = cache.get(key)
+        if data is not None:
+            incr_stat(STATS_KEY.format(name='hits'))
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        incr_stat(STATS_KEY.format(name='misses'))
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список об'єктів з кешу
+        """
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs)
+
+
+class CachedRetrieveMixin(CachedResponseMixin):
+    """
+    Кешує також деталі об'єкта
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Деталі об'єкта з кешу
+        """
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,176 @@
+"""
+Умовні запити (ETag, Last-Modified) для апі рецептів
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """
+    Сильний ETag з хешу частин
+    """
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _strip_weak(etag):
+    """
+    Прибирає позначку слабкого ETag (W/), яку додає стиснення відповіді
+    """
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(etag, header):
+    """
+    Перевіряє чи ETag є в заголовку If-None-Match/If-Match
+    """
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    return _strip_weak(etag) in {_strip_weak(tag) for tag in etags}
+
+
+class ConditionalRequestMixin:
+    """
+    Відповідає 304 Not Modified на умовні GET і 412 Precondition Failed
+    на зміну застарілої версії рецепта, не запускаючи серіалізатор
+    """
+
+    def get_representation(self):
+        """
+        Шлях з параметрами (fields, exclude, фільтри) і формат відповіді:
+        від них залежить тіло, тому вони входять в ETag
+        """
+        return (self.request.get_full_path(),
+                self.request.accepted_renderer.media_type)
+
+    def get_list_validators(self):
+        """
+        ETag і час зміни списку: кількість і останній час зміни рецептів
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        stats = queryset.order_by().aggregate(
+            count=Count('id'), last_modified=Max('updated_at'))
+        etag = make_etag(
+            *self.get_representation(),
+            stats['count'],
+            stats['last_modified'] and stats['last_modified'].isoformat(),
+        )
+        return etag, stats['last_modified']
+
+    def get_object_validators(self, queryset=None):
+        """
+        ETag і час зміни рецепта або (None, None), якщо його немає
+        """
+        if queryset is None:
+            queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            last_modified = queryset.filter(**{
+                self.lookup_field: self.kwargs[lookup_url_kwarg]
+            }).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError, ValidationError):
+            last_modified = None
+        if last_modified is None:
+            return None, None
+        etag = make_etag(
+            *self.get_representation(), last_modified.isoformat())
+        return etag, last_modified
+
+    def _is_not_modified(self, request, etag, last_modified):
+        """
+        Перевіряє If-None-Match, а за його відсутності If-Modified-Since
+        """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return etag_matches(etag, if_none_match)
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_modified_since and last_modified:
+            return int(last_modified.timestamp()) <= if_modified_since
+        return False
+
+    def _set_validators(self, response, etag, last_modified):
+        """
+        Додає ETag і Last-Modified до відповіді
+        """
+        if etag:
+            response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def get_conditional_response(self, validators, handler, request,
+                                 *args, **kwargs):
+        """
+        Повертає 304, якщо у клієнта актуальна версія, інакше відповідь
+        handler з ETag і Last-Modified
+        """
+        etag, last_modified = validators
+        if etag and self._is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            return self._set_validators(response, etag, last_modified)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            self._set_validators(response, etag, last_modified)
+        return response
+
+    def _check_if_match(self, request, queryset):
+        """
+        Повертає 412, якщо If-Match не збігається з поточною версією
+        """
+        if_match = request.META.get('HTTP_IF_MATCH')
+        if not if_match:
+            return None
+        etag, _ = self.get_object_validators(queryset)
+        if etag is None or not etag_matches(etag, if_match):
+            return Response(status=status.HTTP_412_PRECONDITION_FAILED)
+        return None
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список з підтримкою умовного GET
+        """
+        return self.get_conditional_response(
+            self.get_list_validators(), super().list,
+            request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Деталі з підтримкою умовного GET
+        """
+        return self.get_conditional_response(
+            self.get_object_validators(), super().retrieve,
+            request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        """
+        Оновлення з оптимістичним блокуванням через If-Match
+        """
+        with transaction.atomic():
+            queryset = self.filter_queryset(
+                self.get_queryset()).select_for_update()
+            response = self._check_if_match(request, queryset)
+            if response is not None:
+                return response
+            response = super().update(request, *args, **kwargs)
+            etag, last_modified = self.get_object_validators()
+            return self._set_validators(response, etag, last_modified)
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Видалення з оптимістичним блокуванням через If-Match
+        """
+        with transaction.atomic():
+            queryset = self.filter_queryset(
+                self.get_queryset()).select_for_update()
+            response = self._check_if_match(request, queryset)
+            if response is not None:
+                return response
+            return super().destroy(request, *args, **kwargs)
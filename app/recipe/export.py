@@ -0,0 +1,104 @@
+"""
+Потоковий експорт рецептів у NDJSON і CSV
+"""
+import csv
+import json
+
+from django.conf import settings
+
+from core.models import Recipe
+
+EXPORT_FIELDS = ('id', 'title', 'description', 'time_minutes', 'price',
+                 'link', 'image')
+RELATED_FIELDS = (
+    ('tags', Recipe.tags.through, 'tag'),
+    ('ingredients', Recipe.ingredients.through, 'ingredient'),
+)
+CSV_HEADER = EXPORT_FIELDS + tuple(name for name, _, _ in RELATED_FIELDS)
+# роздільник назв тегів/інгредієнтів в одній клітинці CSV
+CSV_NAMES_SEPARATOR = ';'
+
+
+def _chunks(iterable, size):
+    """
+    Розбиває ітератор на списки по size елементів
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_recipes(queryset, chunk_size=None):
+    """
+    Рецепти як словники з назвами тегів і інгредієнтів.
+    Рецепти читаються серверним курсором, а зв'язки - одним запитом
+    на кожну пачку рецептів
+    """
+    chunk_size = chunk_size or settings.RECIPE_EXPORT_CHUNK_SIZE
+    rows = queryset.prefetch_related(None).values(
+        *EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for chunk in _chunks(rows, chunk_size):
+        names = {row['id']: {name: [] for name, _, _ in RELATED_FIELDS}
+                 for row in chunk}
+        for name, through, field in RELATED_FIELDS:
+            links = through.objects.filter(
+                recipe_id__in=names,
+            ).order_by(f'{field}__name').values_list(
+                'recipe_id', f'{field}__name')
+            for recipe_id, attr_name in links:
+                names[recipe_id][name].append(attr_name)
+        for row in chunk:
+            row.update(names[row['id']])
+            yield row
+
+
+def _to_payload(row):
+    """
+    Рядок експорту у форматі тіла запиту на створення рецепта
+    """
+    payload = dict(row, price=str(row['price']))
+    for name, _, _ in RELATED_FIELDS:
+        payload[name] = [{'name': value} for value in row[name]]
+    return payload
+
+
+def export_ndjson(queryset):
+    """
+    Генерує рядки NDJSON, по одному рецепту на рядок
+    """
+    for row in iter_recipes(queryset):
+        yield json.dumps(_to_payload(row), ensure_ascii=False) + '\n'
+
+
+class Echo:
+    """
+    Буфер для csv.writer, що повертає записаний рядок замість
+    збереження
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_csv(queryset):
+    """
+    Генерує рядки CSV з заголовком, назви тегів і інгредієнтів
+    об'єднуються через CSV_NAMES_SEPARATOR
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in iter_recipes(queryset):
+        for name, _, _ in RELATED_FIELDS:
+            row[name] = CSV_NAMES_SEPARATOR.join(row[name])
+        yield writer.writerow([row[field] for field in CSV_HEADER])
+
+
+EXPORT_FORMATS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+    'csv': (export_csv, 'text/csv; charset=utf-8'),
+}
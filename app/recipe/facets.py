@@ -0,0 +1,65 @@
+"""
+Фасети для списку рецептів: кількість рецептів по тегах і інгредієнтах
+"""
+from django.db.models import Count, F, Value
+
+from core.models import Recipe
+
+FACETS = (
+    ('tags', Recipe.tags.through, 'tag'),
+    ('ingredients', Recipe.ingredients.through, 'ingredient'),
+)
+
+
+def get_facets(queryset):
+    """
+    Кількість рецептів з queryset для кожного тегу і інгредієнта.
+    Обидві проміжні таблиці групуються одним запитом через UNION ALL
+    """
+    recipe_ids = queryset.order_by().values('id')
+    grouped = [
+        through.objects.filter(recipe_id__in=recipe_ids).values(
+            facet_id=F(f'{field}_id'),
+            facet_name=F(f'{field}__name'),
+        ).annotate(kind=Value(kind), count=Count('recipe_id')).order_by()
+        for kind, through, field in FACETS
+    ]
+    facets = {kind: [] for kind, _, _ in FACETS}
+    for row in grouped[0].union(*grouped[1:], all=True):
+        facets[row['kind']].append({
+            'id': row['facet_id'],
+            'name': row['facet_name'],
+            'count': row['count'],
+        })
+    for items in facets.values():
+        items.sort(key=lambda item: (-item['count'], item['name']))
+    return facets
+
+
+class FacetedListMixin:
+    """
+    Додає до списку фасети, якщо передано facets=1
+    """
+
+    def _facets_requested(self):
+        """
+        Чи запитано фасети параметром facets
+        """
+        try:
+            return bool(int(self.request.query_params.get('facets', 0)))
+        except ValueError:
+            return False
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список з фасетами для поточного набору фільтрів
+        """
+        response = super().list(request, *args, **kwargs)
+        if response.status_code != 200 or not self._facets_requested():
+            return response
+        facets = get_facets(self.filter_queryset(self.get_queryset()))
+        if isinstance(response.data, dict):
+            response.data['facets'] = facets
+        else:
+            response.data = {'results': response.data, 'facets': facets}
+        return response
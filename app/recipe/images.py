@@ -0,0 +1,75 @@
+"""
+Генерація зменшених копій зображень рецептів. Модуль не залежить від
+Django, бо імпортується в процесах пулу
+"""
+import os
+
+from PIL import Image, ImageOps
+
+VARIANT_FORMAT = 'JPEG'
+VARIANT_EXTENSION = '.jpg'
+VARIANT_QUALITY = 85
+
+
+def resize_image(image, width, height, crop):
+    """
+    Зменшує зображення до розміру width x height: з обрізанням до
+    точного розміру або зі збереженням пропорцій
+    """
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.LANCZOS)
+    return image
+
+
+def generate_variants(source_path, target_dir, stem, variants):
+    """
+    Створює варіанти зображення в target_dir і повертає імена їх файлів
+    і розміри. variants - словник назва -> (ширина, висота, обрізати)
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    result = {}
+    with Image.open(source_path) as original:
+        # JPEG декодується одразу зменшеним, але не менше за найбільший
+        # варіант
+        original.draft('RGB', (
+            max(width for width, _, _ in variants.values()),
+            max(height for _, height, _ in variants.values()),
+        ))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        for name, (width, height, crop) in variants.items():
+            variant = resize_image(image, width, height, crop)
+            filename = f'{stem}_{name}{VARIANT_EXTENSION}'
+            # однакові зображення мають спільні варіанти, тому тимчасовий
+            # файл окремий для кожного процесу
+            tmp_path = os.path.join(
+                target_dir, f'.{filename}.{os.getpid()}.tmp')
+            variant.save(tmp_path, VARIANT_FORMAT, quality=VARIANT_QUALITY,
+                         optimize=True)
+            os.replace(tmp_path, os.path.join(target_dir, filename))
+            result[name] = {
+                'name': filename,
+                'width': variant.width,
+                'height': variant.height,
+            }
+    return result
+
+
+def save_resized(source_path, target_path, width, image_format):
+    """
+    Зберігає копію зображення шириною не більше width у форматі Pillow
+    image_format. Повертає розміри копії
+    """
+    with Image.open(source_path) as original:
+        # обидві сторони не менші за width, бо після повороту за EXIF
+        # ширина може стати висотою
+        original.draft('RGB', (width, width))
+        image = ImageOps.exif_transpose(original)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image = resize_image(image, width, image.height, False)
+        image.save(target_path, image_format, quality=VARIANT_QUALITY)
+        return image.size
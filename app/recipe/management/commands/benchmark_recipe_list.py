@@ -0,0 +1,129 @@
+"""
+Джанго команда яка порівнює швидкість серіалізації списку рецептів
+через RecipeSerializer і RecipeReadSerializer, а також розмір і час
+кодування та розбору списку у JSON і MessagePack
+"""
+import io
+
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Recipe, Tag, Ingredient
+from core.parsers import FastJSONParser, MessagePackParser
+from core.renderers import FastJSONRenderer, MessagePackRenderer
+from recipe.serializers import RecipeSerializer, RecipeReadSerializer
+
+
+FORMATS = (
+    (JSONRenderer, JSONParser),
+    (FastJSONRenderer, FastJSONParser),
+    (MessagePackRenderer, MessagePackParser),
+)
+
+
+def _median_time(func, repeat):
+    """Медіана часу виконання і результат останнього запуску"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def render_model_serializer(queryset):
+    """Список через RecipeSerializer і prefetch, як у вью до оптимізації"""
+    queryset = queryset.only(
+        *RecipeReadSerializer.get_value_fields(RecipeSerializer.Meta.fields)
+    ).prefetch_related(
+        Prefetch('tags',
+                 queryset=Tag.objects.only('id', 'name').order_by('id')),
+        Prefetch('ingredients',
+                 queryset=Ingredient.objects.only(
+                     'id', 'name').order_by('id')),
+    )
+    return JSONRenderer().render(RecipeSerializer(queryset, many=True).data)
+
+
+def render_read_serializer(queryset):
+    """Список через values() і RecipeReadSerializer"""
+    queryset = queryset.values(
+        *RecipeReadSerializer.get_value_fields(RecipeSerializer.Meta.fields))
+    return JSONRenderer().render(
+        RecipeReadSerializer(queryset, many=True).data)
+
+
+class Command(BaseCommand):
+    """Джанго команда для порівняння серіалізаторів списку рецептів"""
+    help = ('Benchmarks the recipe list serialized with RecipeSerializer '
+            'against RecipeReadSerializer, including database queries, '
+            'and the payload size, encode and decode time of JSON and '
+            'MessagePack.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', required=True, help='Email of the recipes owner.')
+        parser.add_argument(
+            '--rows', type=int, nargs='+', default=[1000, 10000],
+            help='List sizes to benchmark.')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Runs per list size, the median is reported.')
+
+    def _measure(self, render, queryset, repeat):
+        """Медіана часу і результат останнього запуску"""
+        return _median_time(lambda: render(queryset.all()), repeat)
+
+    def _measure_formats(self, queryset, repeat):
+        """
+        Розмір, медіана часу кодування і розбору вже серіалізованого
+        списку для кожного формату
+        """
+        data = RecipeReadSerializer(queryset.values(
+            *RecipeReadSerializer.get_value_fields(
+                RecipeSerializer.Meta.fields)), many=True).data
+        results = []
+        for renderer_class, parser_class in FORMATS:
+            render_time, content = _median_time(
+                lambda: renderer_class().render(data), repeat)
+            parse_time, parsed = _median_time(
+                lambda: parser_class().parse(io.BytesIO(content)), repeat)
+            results.append((renderer_class.__name__, render_time,
+                            parse_time, content, parsed))
+        return results
+
+    def handle(self, *args, **options):
+        """Старт команди"""
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["user"]} does not exist')
+        for rows in options['rows']:
+            queryset = Recipe.objects.filter(user=user).order_by('-id')[:rows]
+            slow, slow_content = self._measure(
+                render_model_serializer, queryset, options['repeat'])
+            fast, fast_content = self._measure(
+                render_read_serializer, queryset, options['repeat'])
+            count = queryset.count()
+            self.stdout.write(
+                f'{count} rows: RecipeSerializer {slow * 1000:.1f} ms, '
+                f'RecipeReadSerializer {fast * 1000:.1f} ms, '
+                f'{slow / fast:.1f}x, identical JSON: '
+                f'{slow_content == fast_content}')
+            results = self._measure_formats(queryset, options['repeat'])
+            for name, render_time, parse_time, content, _ in results:
+                self.stdout.write(
+                    f'{count} rows: {name} encode {render_time * 1000:.1f} '
+                    f'ms, decode {parse_time * 1000:.1f} ms, '
+                    f'{len(content) / 1024:.1f} KiB')
+            json_result, fast_result, msgpack_result = results
+            self.stdout.write(
+                f'{count} rows: identical JSON: '
+                f'{json_result[3] == fast_result[3]}, MessagePack decodes '
+                f'to the same data: {json_result[4] == msgpack_result[4]}')
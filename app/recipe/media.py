@@ -0,0 +1,216 @@
+"""
+Віддача зображень рецептів їх власникам: через проксі (X-Accel-Redirect
+чи X-Sendfile) або FileResponse з підтримкою Range
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from drf_spectacular.utils import extend_schema
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.models import Recipe
+from core.storage import content_addressed_name
+from recipe.variants import VARIANTS_DIR
+
+IMAGES_DIR = posixpath.join('uploads', 'recipe')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# блок читання, коли WSGI сервер не має sendfile і файл читає Python
+BLOCK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """
+    Діапазон з Range повністю поза файлом
+    """
+
+
+def parse_range(header, size):
+    """
+    Перший і останній байт (включно) з заголовка Range або None, якщо
+    заголовка немає, він некоректний чи задає кілька діапазонів, тоді
+    віддається весь файл
+    """
+    match = RANGE_RE.match(header or '')
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start:
+        # останні N байтів
+        if not end:
+            return None
+        if int(end) == 0:
+            raise RangeNotSatisfiable()
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    if end and start > int(end):
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+class FileRange:
+    """
+    Файл, з якого читається тільки діапазон байтів. fileno дає WSGI
+    серверу віддати діапазон через sendfile без копіювання в Python
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        """
+        Читає не більше, ніж лишилось в діапазоні
+        """
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def owner_query(name):
+    """
+    Умова на рецепти, до яких належить файл: оригінал зображення чи
+    його варіант. None, якщо це не зображення рецепта
+    """
+    directory, filename = posixpath.split(name)
+    if directory == VARIANTS_DIR:
+        stem, _, variant = posixpath.splitext(filename)[0].rpartition('_')
+        if not stem or variant not in settings.RECIPE_IMAGE_VARIANTS:
+            return None
+        # варіанти названі за іменем оригіналу без розширення
+        return (Q(image__startswith=posixpath.join(IMAGES_DIR, f'{stem}.'))
+                | Q(image__startswith=content_addressed_name(
+                    IMAGES_DIR, stem, '.')))
+    if name.startswith(f'{IMAGES_DIR}/'):
+        return Q(image=name)
+    return None
+
+
+def cache_headers(response, mtime):
+    """
+    Ім'я файлу зображення змінюється разом з вмістом, тому браузер може
+    кешувати його без перевірок
+    """
+    response['Cache-Control'] = (
+        f'private, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable')
+    if mtime is not None:
+        response['Last-Modified'] = http_date(mtime)
+    return response
+
+
+class FirstRendererNegotiation(BaseContentNegotiation):
+    """
+    Не узгоджує формат за Accept: файл віддається як є, а помилки
+    першим рендерером. Браузер просить зображення з Accept: image/*,
+    на що рендерери апі відповіли б 406
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+@extend_schema(exclude=True)
+class RecipeMediaView(APIView):
+    """
+    Віддає файли з MEDIA_ROOT тільки власнику рецепта. При
+    MEDIA_SENDFILE_BACKEND байти віддає проксі, інакше FileResponse
+    """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    content_negotiation_class = FirstRendererNegotiation
+
+    def _sendfile(self, name, content_type):
+        """
+        Відповідь без тіла, файл віддає проксі
+        """
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_SENDFILE_BACKEND == 'nginx':
+            response['X-Accel-Redirect'] = quote(
+                settings.MEDIA_ACCEL_REDIRECT_PREFIX + name)
+        else:
+            response['X-Sendfile'] = default_storage.path(name)
+        return cache_headers(response, None)
+
+    def _file_response(self, request, path, content_type):
+        """
+        FileResponse з відповіддю 304 на If-Modified-Since і 206 на Range
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise Http404()
+        if not was_modified_since(
+                request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                stat.st_mtime, stat.st_size):
+            return cache_headers(
+                HttpResponse(status=304), stat.st_mtime)
+
+        start, end = 0, stat.st_size - 1
+        byte_range = None
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range is None or if_range == http_date(stat.st_mtime):
+            try:
+                byte_range = parse_range(
+                    request.META.get('HTTP_RANGE'), stat.st_size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{stat.st_size}'
+                return response
+        if byte_range is not None:
+            start, end = byte_range
+
+        response = FileResponse(
+            FileRange(open(path, 'rb'), start, end - start + 1),
+            content_type=content_type)
+        response.block_size = BLOCK_SIZE
+        response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+        if byte_range is not None:
+            response.status_code = 206
+            response['Content-Range'] = (
+                f'bytes {start}-{end}/{stat.st_size}')
+        return cache_headers(response, stat.st_mtime)
+
+    def get(self, request, path):
+        """
+        Перевіряє, що файл належить рецепту користувача, і віддає його
+        """
+        name = posixpath.normpath(path).lstrip('/')
+        if name != path or name.startswith('..'):
+            raise Http404()
+        query = owner_query(name)
+        if query is None or not Recipe.objects.filter(
+                query, user=request.user).exists():
+            raise Http404()
+        content_type = (mimetypes.guess_type(name)[0]
+                        or 'application/octet-stream')
+        if settings.MEDIA_SENDFILE_BACKEND:
+            return self._sendfile(name, content_type)
+        return self._file_response(
+            request, default_storage.path(name), content_type)
@@ -0,0 +1,43 @@
+"""
+Пагінація для апі рецептів
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Курсорна (keyset) пагінація по сортуванню вью.
+
+    Вмикається параметром `page_size` або `cursor`, без них список
+    повертається повністю, як і раніше. Позиція в курсорі кодує значення
+    ключа сортування, тому кожна сторінка - це пошук по індексу, а не
+    OFFSET, і час відповіді не залежить від глибини сторінки.
+    """
+    page_size = None
+    default_page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-id'
+
+    def get_page_size(self, request):
+        """
+        Розмір сторінки або None, якщо пагінацію не запитано
+        """
+        page_size = super().get_page_size(request)
+        if not page_size and self.cursor_query_param in request.query_params:
+            return self.default_page_size
+        return page_size
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Бере сортування з вью, щоб курсор збігався з get_queryset
+        """
+        if hasattr(view, 'get_ordering'):
+            ordering = view.get_ordering()
+        else:
+            ordering = getattr(view, 'ordering', None)
+        if ordering:
+            if isinstance(ordering, str):
+                return (ordering,)
+            return tuple(ordering)
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,196 @@
+"""
+Зменшені копії зображень рецептів на запит з дисковим LRU кешем
+"""
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from recipe.cache import get_cache, incr_stat
+from recipe.images import save_resized
+
+STATS_KEY = 'recipe:resize:{name}'
+EVICT_LOCK = '.evict.lock'
+# після витіснення кеш займає не більше цієї частки ліміту, щоб не
+# витісняти на кожному записі
+EVICT_LOW_WATERMARK = 0.9
+# скільки останніх часів генерації зберігається для p99
+GENERATION_SAMPLES = 1000
+
+_generation_times = deque(maxlen=GENERATION_SAMPLES)
+_written = 0
+_written_lock = threading.Lock()
+
+
+def resized_path(image_name, width, renderer):
+    """
+    Шлях копії в кеші. Ключ залежить від імені оригіналу, тому копія
+    заміненого зображення не віддається
+    """
+    key = hashlib.sha256(
+        f'{image_name}:{width}:{renderer.format}'.encode()).hexdigest()
+    return os.path.join(settings.RECIPE_IMAGE_RESIZE_CACHE_DIR, key[:2],
+                        f'{key}{renderer.extension}')
+
+
+def get_resize_stats():
+    """
+    Попадання, промахи і частка попадань кешу копій, а також p99 часу
+    генерації копії в цьому процесі в мілісекундах
+    """
+    cache = get_cache()
+    stats = {
+        name: cache.get(STATS_KEY.format(name=name), 0)
+        for name in ('hits', 'misses')
+    }
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / total if total else 0.0
+    times = sorted(_generation_times)
+    stats['generation_p99_ms'] = (
+        times[min(len(times) - 1, int(len(times) * 0.99))] * 1000
+        if times else 0.0)
+    return stats
+
+
+def reset_resize_stats():
+    """
+    Обнуляє лічильники кешу копій
+    """
+    get_cache().delete_many(
+        [STATS_KEY.format(name=name) for name in ('hits', 'misses')])
+    _generation_times.clear()
+
+
+def _open(path):
+    """
+    Відкриває файл без імені в об'єкті файлу: FileResponse не шукатиме
+    його розмір за шляхом, який витіснення може видалити
+    """
+    return os.fdopen(os.open(path, os.O_RDONLY), 'rb')
+
+
+def _open_cached(path):
+    """
+    Відкриває копію і позначає її як використану або повертає None.
+    Відкритий файл можна віддати, навіть якщо витіснення його видалить.
+    Використовується час зміни, бо atime часто не оновлюється (relatime,
+    noatime)
+    """
+    try:
+        file = _open(path)
+    except FileNotFoundError:
+        return None
+    os.utime(file.fileno())
+    return file
+
+
+def evict(cache_dir, max_bytes):
+    """
+    Видаляє найдавніше використані копії, поки кеш більший за
+    EVICT_LOW_WATERMARK від max_bytes. Повертає кількість видалених
+    файлів. Якщо витіснення вже йде в іншому процесі, нічого не робить
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, EVICT_LOCK), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        entries = []
+        total = 0
+        for shard in os.scandir(cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(('.lock', '.tmp')):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        limit = max_bytes * EVICT_LOW_WATERMARK
+        if total <= max_bytes:
+            return 0
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+
+def _record_write(size):
+    """
+    Рахує записані в кеш байти і запускає витіснення, коли їх набралось
+    на десяту частину ліміту, щоб не сканувати каталог на кожен запис
+    """
+    global _written
+    max_bytes = settings.RECIPE_IMAGE_RESIZE_CACHE_MAX_BYTES
+    with _written_lock:
+        _written += size
+        if _written < max_bytes * (1 - EVICT_LOW_WATERMARK):
+            return
+        _written = 0
+    evict(settings.RECIPE_IMAGE_RESIZE_CACHE_DIR, max_bytes)
+
+
+def _remove_lock(lock, lock_path):
+    """
+    Видаляє файл блокування, якщо це досі наш файл. Хто чекав на нього,
+    після блокування побачить готову копію
+    """
+    try:
+        if os.stat(lock_path).st_ino == os.fstat(lock.fileno()).st_ino:
+            os.remove(lock_path)
+    except FileNotFoundError:
+        pass
+
+
+def get_resized_image(image_name, width, renderer):
+    """
+    Відкритий файл копії зображення шириною width у форматі renderer.
+    Копія генерується один раз навіть при паралельних запитах: інші
+    запити чекають на блокування і беруть готовий результат
+    """
+    path = resized_path(image_name, width, renderer)
+    file = _open_cached(path)
+    if file is not None:
+        incr_stat(STATS_KEY.format(name='hits'))
+        return file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock_path = f'{path}.lock'
+    with open(lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        file = _open_cached(path)
+        if file is not None:
+            incr_stat(STATS_KEY.format(name='hits'))
+            return file
+        started = time.perf_counter()
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            save_resized(default_storage.path(image_name), tmp_path,
+                         width, renderer.pillow_format)
+            file = _open(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            _remove_lock(lock, lock_path)
+        _generation_times.append(time.perf_counter() - started)
+        incr_stat(STATS_KEY.format(name='misses'))
+    _record_write(os.fstat(file.fileno()).st_size)
+    return file
@@ -1,6 +1,11 @@
 """
 Серіалізатори для моделей рецептів
 """
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from core.models import Recipe, Tag, Ingredient
 
@@ -27,7 +32,123 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class IngredientDetailSerializer(IngredientSerializer):
+    """
+    Серіалізатор для інгредієнтів з кількістю рецептів
+    """
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ('recipe_count',)
+        read_only_fields = ('id', 'recipe_count')
+
+
+class TagDetailSerializer(TagSerializer):
+    """
+    Серіалізатор для тегів з кількістю рецептів
+    """
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('recipe_count',)
+        read_only_fields = ('id', 'recipe_count')
+
+
+def get_or_create_attrs(model, user, names):
+    """
+    Повертає словник назва -> тег чи інгредієнт користувача: наявні
+    одним запитом, відсутні одним bulk_create
+    """
+    if not names:
+        return {}
+    objs = {
+        obj.name: obj
+        for obj in model.objects.filter(user=user, name__in=names)
+    }
+    missing = [name for name in names if name not in objs]
+    if missing:
+        # ignore_conflicts: паралельний запит міг вже створити назву
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing],
+            ignore_conflicts=True,
+        )
+        objs.update({
+            obj.name: obj
+            for obj in model.objects.filter(user=user, name__in=missing)
+        })
+    return objs
+
+
+class SparseFieldsMixin:
+    """
+    Дозволяє залишити тільки поля `fields` або прибрати поля `exclude`
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        exclude = kwargs.pop('exclude', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+        if exclude is not None:
+            for field_name in set(self.fields) & set(exclude):
+                self.fields.pop(field_name)
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    Серіалізатор для пакетного створення рецептів
+    """
+
+    def _get_or_create_attrs_by_name(self, model, items, key):
+        """
+        Повертає словник назва -> тег чи інгредієнт для всіх рецептів
+        """
+        names = [
+            {'name': attr['name']}
+            for item in items for attr in item.get(key, [])
+        ]
+        return {
+            obj.name: obj
+            for obj in self.child._get_or_create_attrs(model, names)
+        }
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """
+        Створює всі рецепти, теги, інгредієнти і зв'язки кількома
+        запитами незалежно від розміру пакета
+        """
+        auth_user = self.context['request'].user
+        tags = self._get_or_create_attrs_by_name(Tag, validated_data, 'tags')
+        ingredients = self._get_or_create_attrs_by_name(
+            Ingredient, validated_data, 'ingredients')
+        recipes = Recipe.objects.bulk_create([
+            Recipe(user=auth_user, **{
+                key: value for key, value in item.items()
+                if key not in ('tags', 'ingredients')
+            })
+            for item in validated_data
+        ])
+        TagThrough = Recipe.tags.through
+        IngredientThrough = Recipe.ingredients.through
+        TagThrough.objects.bulk_create([
+            TagThrough(recipe_id=recipe.id, tag_id=tags[name].id)
+            for recipe, item in zip(recipes, validated_data)
+            for name in dict.fromkeys(
+                tag['name'] for tag in item.get('tags', []))
+        ])
+        IngredientThrough.objects.bulk_create([
+            IngredientThrough(recipe_id=recipe.id,
+                              ingredient_id=ingredients[name].id)
+            for recipe, item in zip(recipes, validated_data)
+            for name in dict.fromkeys(
+                ingredient['name']
+                for ingredient in item.get('ingredients', []))
+        ])
+        return recipes
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Серіалізатор для моделі рецептів
     """
@@ -39,31 +160,31 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'time_minutes', 'price',
                   'link', 'tags', 'ingredients',)
         read_only_fields = ('id',)
+        list_serializer_class = RecipeListSerializer
+
+    def _get_or_create_attrs(self, model, items):
+        """
+        Повертає теги чи інгредієнти користувача з назвами з items:
+        наявні одним запитом, відсутні одним bulk_create
+        """
+        names = list(dict.fromkeys(item['name'] for item in items))
+        objs = get_or_create_attrs(model, self.context['request'].user, names)
+        return [objs[name] for name in names]
 
     def _get_or_create_tags(self, tags, recipe):
         """
         Створення тегів
         """
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        recipe.tags.add(*self._get_or_create_attrs(Tag, tags))
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """
         Створення інгредієнтів
         """
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
+        recipe.ingredients.add(
+            *self._get_or_create_attrs(Ingredient, ingredients))
 
+    @transaction.atomic
     def create(self, validated_data):
         """
         Створення рецепта
@@ -75,21 +196,29 @@ class RecipeSerializer(serializers.ModelSerializer):
         self._get_or_create_ingredients(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
-        Оновлення рецепта
+        Оновлення рецепта: змінюються тільки зв'язки і поля, які
+        відрізняються від поточних
         """
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            # set() порівнює з поточними зв'язками і видаляє/додає
+            # тільки різницю
+            instance.tags.set(self._get_or_create_attrs(Tag, tags))
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
-        for key, value in validated_data.items():
-            setattr(instance, key, value)
-        instance.save()
+            instance.ingredients.set(
+                self._get_or_create_attrs(Ingredient, ingredients))
+        changed_fields = [
+            key for key, value in validated_data.items()
+            if getattr(instance, key) != value
+        ]
+        for key in changed_fields:
+            setattr(instance, key, validated_data[key])
+        if changed_fields:
+            instance.save(update_fields=changed_fields + ['updated_at'])
         return instance
 
 
@@ -98,8 +227,30 @@ class RecipeDetailSerializer(RecipeSerializer):
     Серіалізатор для деталей рецепта
     """
 
+    image_variants = serializers.SerializerMethodField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ('description', 'image')
+        fields = RecipeSerializer.Meta.fields + (
+            'description', 'image', 'image_variants')
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_image_variants(self, recipe):
+        """
+        URL і розміри зменшених копій зображення, порожньо поки вони
+        генеруються
+        """
+        request = self.context.get('request')
+        variants = {}
+        for name, variant in recipe.image_variants.items():
+            url = default_storage.url(variant['path'])
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            variants[name] = {
+                'url': url,
+                'width': variant['width'],
+                'height': variant['height'],
+            }
+        return variants
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
@@ -112,3 +263,105 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         fields = ('id', 'image',)
         read_only_fields = ('id',)
         extra_kwargs = {'image': {'required': True}, }
+
+
+class RecipeImageResizeSerializer(serializers.Serializer):
+    """
+    Параметри копії зображення рецепта
+    """
+    width = serializers.ChoiceField(
+        choices=settings.RECIPE_IMAGE_RESIZE_WIDTHS)
+
+
+class RecipeReadSerializer:
+    """
+    Швидкий серіалізатор списку рецептів тільки для читання.
+
+    Будує відповідь з рядків values() і одного запиту на кожен вкладений
+    список замість полів DRF для кожного об'єкта. Набір полів, їх порядок
+    і форматування значень беруться з serializer_class, тому JSON такий
+    самий, як у RecipeSerializer
+    """
+    serializer_class = RecipeSerializer
+    # to_representation цих полів не змінює значення з бази
+    identity_fields = (serializers.CharField, serializers.IntegerField)
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.serializer = self.serializer_class(context=context, **kwargs)
+
+    @classmethod
+    def get_value_fields(cls, rendered):
+        """
+        Колонки рецепта для values() під поля відповіді
+        """
+        return ['id'] + [
+            field.name for field in Recipe._meta.concrete_fields
+            if field.name in rendered and field.name != 'id'
+        ]
+
+    def _get_columns(self, fields, nested=None):
+        """
+        Опис полів відповіді: назва, колонка, функція форматування
+        (None - значення з бази без змін) і вкладені списки по id
+        """
+        nested = nested or {}
+        columns = []
+        for name, field in fields.items():
+            converter = None
+            if type(field) not in self.identity_fields:
+                converter = field.to_representation
+            columns.append((name, field.source, converter, nested.get(name)))
+        return columns
+
+    def _build(self, columns, row):
+        """
+        Словник відповіді з рядка values()
+        """
+        item = {}
+        for name, source, converter, nested in columns:
+            if nested is not None:
+                item[name] = nested.get(row['id'], [])
+                continue
+            value = row[source]
+            if value is not None and converter is not None:
+                value = converter(value)
+            item[name] = value
+        return item
+
+    def _load_nested(self, field, recipe_ids):
+        """
+        Вкладений список для кожного рецепта одним запитом, в тому ж
+        порядку, що і prefetch у вью
+        """
+        child = field.child
+        names = list(child.fields)
+        columns = self._get_columns(child.fields)
+        rows = child.Meta.model.objects.filter(
+            recipe__in=recipe_ids,
+        ).order_by('id').values_list('recipe', *names)
+        # теги і інгредієнти мають тільки id і name, їх можна брати з
+        # рядка як є
+        plain = all(converter is None for _, _, converter, _ in columns)
+        nested = {}
+        for recipe_id, *values in rows:
+            item = dict(zip(names, values))
+            if not plain:
+                item = self._build(columns, item)
+            nested.setdefault(recipe_id, []).append(item)
+        return nested
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        fields = self.serializer.fields
+        recipe_ids = [row['id'] for row in rows]
+        nested = {
+            name: self._load_nested(field, recipe_ids) if rows else {}
+            for name, field in fields.items()
+            if isinstance(field, serializers.ListSerializer)
+        }
+        columns = self._get_columns(fields, nested)
+        data = [self._build(columns, row) for row in rows]
+        return data if self.many else data[0]
@@ -0,0 +1,36 @@
+"""
+Сигнали для інвалідації кешу відповідей апі рецептів
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import bump_user_version
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """
+    Інвалідує кеш користувача при зміні рецепта, тегу чи інгредієнта.
+    Версія змінюється після коміту, інакше паралельний запит закешує
+    старі дані під новою версією
+    """
+    transaction.on_commit(partial(bump_user_version, instance.user_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_user_cache_m2m(sender, instance, action, **kwargs):
+    """
+    Інвалідує кеш користувача при зміні тегів чи інгредієнтів рецепта
+    """
+    if action.startswith('post_'):
+        transaction.on_commit(partial(bump_user_version, instance.user_id))
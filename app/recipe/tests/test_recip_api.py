@@ -1,19 +1,44 @@
 """
 Тести для рецептів API
 """
-from django.test import TestCase
+import csv
+import io
+import json
+import struct
+import threading
+import zlib
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import Mock, patch
+import msgpack
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 import tempfile
 import os
 from PIL import Image
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.urls import reverse
+from django.utils.http import urlencode
 from rest_framework.test import APIClient
 from rest_framework import status
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, StoredImage, Tag, Ingredient
 from decimal import Decimal
+from core.renderers import WebPRenderer
+from recipe import resize, variants
+from recipe.resize import get_resize_stats, get_resized_image, \
+    reset_resize_stats
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.cache import get_cache, get_cache_stats, get_user_version, \
+    reset_cache_stats
+from recipe.variants import enqueue_image_variants, save_variants
+from recipe.views import RecipeViewSet
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BATCH_URL = reverse('recipe:recipe-batch')
+EXPORT_URL = reverse('recipe:recipe-export')
 
 
 def detail_url(recipe_id):
@@ -26,6 +51,11 @@ def image_upload_url(recipe_id):
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
 
+def media_url(name):
+    """Повертає URL файлу з MEDIA_ROOT"""
+    return reverse('media', kwargs={'path': name})
+
+
 def create_recipe(user, **params):
     """Створення рецепта"""
     defaults = {
@@ -45,6 +75,25 @@ def create_user(**params):
     return get_user_model().objects.create_user(**params)
 
 
+def noise_jpeg(size):
+    """JPEG з шумом, який погано стискається"""
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(
+        buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def png_header(width, height):
+    """PNG 1x1, в заголовку якого записано розміри width x height"""
+    buffer = io.BytesIO()
+    Image.new('L', (1, 1)).save(buffer, format='PNG')
+    content = bytearray(buffer.getvalue())
+    # IHDR: ширина і висота після сигнатури, довжини і типу чанка
+    content[16:24] = struct.pack('>II', width, height)
+    content[29:33] = struct.pack('>I', zlib.crc32(bytes(content[12:29])))
+    return bytes(content)
+
+
 class PublicRecipeApiTests(TestCase):
     """Тести для рецептів API (публічні)"""
 
@@ -377,6 +426,110 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(recipe.ingredients.count(), 0)
         self.assertNotIn(ingredient, recipe.ingredients.all())
 
+    def test_create_recipe_with_many_attrs_query_count(self):
+        """
+        Тест: кількість запитів при створенні рецепта не залежить від
+        кількості тегів і інгредієнтів
+        """
+        Ingredient.objects.create(user=self.user, name='Ingredient 0')
+        payload = {
+            'title': 'Soup',
+            'time_minutes': 30,
+            'price': Decimal('5.90'),
+            'tags': [{'name': f'Tag {i}'} for i in range(20)],
+            'ingredients': [{'name': f'Ingredient {i}'} for i in range(20)],
+        }
+        with self.assertNumQueries(17):
+            res = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 20)
+        self.assertEqual(recipe.ingredients.count(), 20)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 20)
+
+    def test_create_recipe_with_duplicate_tag_names(self):
+        """
+        Тест: однакові назви в запиті дають один тег
+        """
+        payload = {
+            'title': 'Soup',
+            'time_minutes': 30,
+            'price': Decimal('5.90'),
+            'tags': [{'name': 'Thai'}, {'name': 'Thai'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_update_recipe_changes_only_tag_diff(self):
+        """
+        Тест: зміна одного тегу не видаляє і не додає решту зв'язків
+        """
+        recipe = create_recipe(user=self.user)
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                for i in range(3)]
+        recipe.tags.add(*tags)
+        through_ids = set(Recipe.tags.through.objects.filter(
+            recipe=recipe, tag__in=tags[:2]).values_list('id', flat=True))
+        payload = {'tags': [{'name': 'Tag 0'}, {'name': 'Tag 1'},
+                            {'name': 'Tag 3'}]}
+        url = detail_url(recipe.id)
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(url, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 19)
+        through_writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT INTO "core_recipe_tags"',
+                                        'DELETE FROM "core_recipe_tags"'))
+        ]
+        self.assertEqual(len(through_writes), 2)
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {'Tag 0', 'Tag 1', 'Tag 3'})
+        self.assertTrue(through_ids <= set(
+            Recipe.tags.through.objects.filter(
+                recipe=recipe).values_list('id', flat=True)))
+
+    def test_update_recipe_unchanged_query_count(self):
+        """
+        Тест: PATCH без змін не пише в базу
+        """
+        recipe = create_recipe(user=self.user, title='Soup')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Thai'))
+        payload = {'title': 'Soup', 'tags': [{'name': 'Thai'}]}
+        url = detail_url(recipe.id)
+        updated_at = Recipe.objects.get(id=recipe.id).updated_at
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(url, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(
+            Recipe.objects.get(id=recipe.id).updated_at, updated_at)
+
+    def test_update_recipe_single_field_query_count(self):
+        """
+        Тест: зміна одного поля оновлює тільки його
+        """
+        recipe = create_recipe(user=self.user, title='Soup')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Thai'))
+        url = detail_url(recipe.id)
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(url, {'title': 'Stew'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"title"', writes[0])
+        self.assertNotIn('"description"', writes[0])
+
     def test_filter_by_tags(self):
         """
         Тест для перевірки чи можна фільтрувати рецепти по тегах
@@ -419,6 +572,774 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
 
+    def test_list_recipes_query_count_constant(self):
+        """
+        Тест для перевірки що список рецептів не робить N+1 запитів
+        """
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user,
+                                          name=f'Ingredient {i}'))
+        # рецепти, теги, інгредієнти і агрегат для ETag
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+        for item in res.data:
+            self.assertEqual(len(item['tags']), 1)
+            self.assertEqual(len(item['ingredients']), 1)
+
+    def test_get_recipe_detail_query_count(self):
+        """
+        Тест для перевірки кількості запитів для деталей рецепта
+        """
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt'))
+        # рецепт, теги, інгредієнти і час зміни для ETag
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.data, RecipeDetailSerializer(recipe).data)
+
+    def test_list_recipes_cursor_pagination(self):
+        """
+        Тест для перевірки курсорної пагінації рецептів
+        """
+        recipes = [create_recipe(user=self.user, title=f'Recipe {i}')
+                   for i in range(5)]
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['previous'])
+        ids = [item['id'] for item in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertIsNotNone(res.data['previous'])
+            ids += [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+    def test_filter_by_tags_no_duplicates(self):
+        """
+        Тест для перевірки що рецепт з кількома тегами повертається один раз
+        """
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='Tag 1')
+        tag2 = Tag.objects.create(user=self.user, name='Tag 2')
+        recipe.tags.add(tag1, tag2)
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['id'], recipe.id)
+
+    def test_filter_by_tags_and_ingredients_match_all(self):
+        """
+        Тест для перевірки фільтрації рецептів з усіма тегами/інгредієнтами
+        """
+        tag1 = Tag.objects.create(user=self.user, name='Tag 1')
+        tag2 = Tag.objects.create(user=self.user, name='Tag 2')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe1 = create_recipe(user=self.user, title='Recipe 1')
+        recipe1.tags.add(tag1, tag2)
+        recipe1.ingredients.add(ingredient)
+        recipe2 = create_recipe(user=self.user, title='Recipe 2')
+        recipe2.tags.add(tag1)
+        recipe2.ingredients.add(ingredient)
+        recipe3 = create_recipe(user=self.user, title='Recipe 3')
+        recipe3.tags.add(tag1, tag2)
+        params = {
+            'tags': f'{tag1.id},{tag2.id},{tag1.id}',
+            'ingredients': f'{ingredient.id}',
+            'match': 'all',
+        }
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [recipe1.id])
+
+    def test_list_recipes_sparse_fields(self):
+        """
+        Тест для перевірки параметра fields у списку рецептів
+        """
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{'id': recipe.id, 'title': recipe.title}])
+
+    def test_list_recipes_sparse_fields_nested(self):
+        """
+        Тест для перевірки що fields завантажує тільки запитані зв'язки
+        """
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL, {'fields': 'title,tags'})
+        self.assertEqual(res.data, [{
+            'title': recipe.title,
+            'tags': [{'id': tag.id, 'name': tag.name}],
+        }])
+
+    def test_get_recipe_detail_exclude_fields(self):
+        """
+        Тест для перевірки параметра exclude у деталях рецепта
+        """
+        recipe = create_recipe(user=self.user)
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                detail_url(recipe.id),
+                {'exclude': 'tags,ingredients,description'})
+        expected = RecipeDetailSerializer(recipe).data
+        for field_name in ('tags', 'ingredients', 'description'):
+            expected.pop(field_name)
+        self.assertEqual(res.data, expected)
+
+    def test_list_recipes_empty_sparse_fields(self):
+        """
+        Тест: порожні fields і exclude не фільтрують поля
+        """
+        create_recipe(user=self.user)
+        expected = self.client.get(RECIPES_URL).data
+        for params in ({'fields': ''}, {'exclude': ''}, {'fields': ','}):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data, expected)
+
+    def test_unknown_sparse_fields_rejected(self):
+        """
+        Тест: невідомі назви полів в fields чи exclude дають 400
+        """
+        recipe = create_recipe(user=self.user)
+        for url, params in (
+                (RECIPES_URL, {'fields': 'bogus'}),
+                (RECIPES_URL, {'fields': 'id,bogus'}),
+                (RECIPES_URL, {'exclude': 'bogus'}),
+                (detail_url(recipe.id), {'fields': 'bogus'})):
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            param = next(iter(params))
+            self.assertEqual(res.data[param], ['Unknown fields: bogus.'])
+
+    def test_list_recipes_facets(self):
+        """
+        Тест для перевірки фасетів для поточного фільтра одним запитом
+        """
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        lunch = Tag.objects.create(user=self.user, name='Lunch')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe1 = create_recipe(user=self.user, title='Recipe 1')
+        recipe1.tags.add(vegan, lunch)
+        recipe1.ingredients.add(salt)
+        recipe2 = create_recipe(user=self.user, title='Recipe 2')
+        recipe2.tags.add(vegan)
+        create_recipe(user=self.user, title='Recipe 3').tags.add(lunch)
+        other = create_recipe(user=create_user(email='other@example.com'))
+        other.tags.add(Tag.objects.create(user=other.user, name='Vegan'))
+
+        # рецепти, теги, інгредієнти, ETag і фасети
+        with self.assertNumQueries(5):
+            res = self.client.get(
+                RECIPES_URL, {'facets': 1, 'tags': f'{vegan.id}'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertEqual(res.data['facets'], {
+            'tags': [
+                {'id': vegan.id, 'name': 'Vegan', 'count': 2},
+                {'id': lunch.id, 'name': 'Lunch', 'count': 1},
+            ],
+            'ingredients': [{'id': salt.id, 'name': 'Salt', 'count': 1}],
+        })
+
+    def test_list_recipes_facets_paginated(self):
+        """
+        Тест для перевірки фасетів разом з курсорною пагінацією
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Recipe {i}').tags.add(tag)
+        res = self.client.get(RECIPES_URL, {'facets': 1, 'page_size': 1})
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertIsNotNone(res.data['next'])
+        self.assertEqual(res.data['facets']['tags'][0]['count'], 3)
+        self.assertEqual(res.data['facets']['ingredients'], [])
+
+
+class RecipeSearchApiTests(TestCase):
+    """
+    Тести для повнотекстового пошуку рецептів
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com',
+                                password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def _search(self, search, **params):
+        """Повертає id знайдених рецептів"""
+        res = self.client.get(RECIPES_URL, {'search': search, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in res.data]
+
+    def test_search_ranks_title_above_description(self):
+        """
+        Тест: збіг у назві важливіший за збіг в описі
+        """
+        in_description = create_recipe(
+            user=self.user, title='Soup', description='Spicy curry soup')
+        in_title = create_recipe(
+            user=self.user, title='Curry', description='Rice')
+        create_recipe(user=self.user, title='Salad', description='Greens')
+        self.assertEqual(self._search('curry'),
+                         [in_title.id, in_description.id])
+
+    def test_search_after_queryset_update(self):
+        """
+        Тест: update() назви чи опису перераховує вектор, а зміна інших
+        полів його не скидає
+        """
+        recipe = create_recipe(
+            user=self.user, title='Soup', description='Rice')
+        Recipe.objects.filter(id=recipe.id).update(title='Curry')
+        self.assertEqual(self._search('curry'), [recipe.id])
+        Recipe.objects.filter(id=recipe.id).update(description='Noodles')
+        self.assertEqual(self._search('noodles'), [recipe.id])
+        self.assertEqual(self._search('rice'), [])
+        Recipe.objects.filter(id=recipe.id).update(
+            image_variants={'small': {}})
+        self.assertEqual(self._search('curry'), [recipe.id])
+
+    def test_search_by_tag_and_ingredient_names(self):
+        """
+        Тест: пошук знаходить рецепти по тегах і інгредієнтах, в тому
+        числі після перейменування тегу
+        """
+        recipe = create_recipe(user=self.user, title='Soup')
+        tag = Tag.objects.create(user=self.user, name='Thai')
+        recipe.tags.add(tag)
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Lemongrass'))
+        self.assertEqual(self._search('thai'), [recipe.id])
+        self.assertEqual(self._search('lemongrass'), [recipe.id])
+        tag.name = 'Vietnamese'
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        self.assertEqual(self._search('thai'), [])
+        self.assertEqual(self._search('vietnamese'), [recipe.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.clear()
+        self.assertEqual(self._search('vietnamese'), [])
+
+    def test_search_with_tag_filter(self):
+        """
+        Тест: пошук поєднується з фільтром по тегах
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe1 = create_recipe(user=self.user, title='Bean soup')
+        recipe1.tags.add(tag)
+        create_recipe(user=self.user, title='Chicken soup')
+        self.assertEqual(self._search('soup', tags=str(tag.id)),
+                         [recipe1.id])
+
+    def test_search_limited_to_user(self):
+        """
+        Тест: пошук не знаходить рецепти інших користувачів
+        """
+        other_user = create_user(email='other@example.com',
+                                 password='testpass123')
+        create_recipe(user=other_user, title='Curry')
+        self.assertEqual(self._search('curry'), [])
+
+    def test_search_cursor_pagination(self):
+        """
+        Тест: сторінки пошуку йдуть по релевантності без повторів
+        """
+        recipes = [
+            create_recipe(user=self.user, title=f'Soup {i}',
+                          description='soup ' * i)
+            for i in range(5)
+        ]
+        res = self.client.get(RECIPES_URL, {'search': 'soup', 'page_size': 2})
+        ids = [item['id'] for item in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [item['id'] for item in res.data['results']]
+        self.assertEqual(sorted(ids), [recipe.id for recipe in recipes])
+        self.assertEqual(ids, self._search('soup'))
+
+
+class RecipeBatchApiTests(TestCase):
+    """
+    Тести для пакетного створення рецептів
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com',
+                                password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def _payload(self, count, **params):
+        """Список рецептів для пакетного створення"""
+        return [{
+            'title': f'Recipe {i}',
+            'time_minutes': 10,
+            'price': '5.00',
+            'tags': [{'name': 'Dinner'}, {'name': f'Tag {i}'}],
+            'ingredients': [{'name': 'Salt'}],
+            **params,
+        } for i in range(count)]
+
+    def test_batch_create_recipes(self):
+        """
+        Тест: пакетне створення рецептів з тегами і інгредієнтами
+        """
+        Tag.objects.create(user=self.user, name='Dinner')
+        res = self.client.post(BATCH_URL, self._payload(3), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(recipes.count(), 3)
+        for item, recipe in zip(res.data, recipes):
+            self.assertEqual(item['status'], status.HTTP_201_CREATED)
+            self.assertEqual(item['data'], RecipeSerializer(recipe).data)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(
+            Recipe.tags.through.objects.filter(
+                recipe__user=self.user).count(), 6)
+
+    def test_batch_create_query_count_constant(self):
+        """
+        Тест: кількість запитів не залежить від розміру пакета
+        """
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(BATCH_URL, self._payload(2), format='json')
+        self.client.force_authenticate(
+            create_user(email='other@example.com', password='testpass123'))
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(BATCH_URL, self._payload(50), format='json')
+        self.assertEqual(len(small), len(large))
+
+    def test_batch_create_partial_errors(self):
+        """
+        Тест: помилки повертаються для кожного елемента окремо
+        """
+        payload = self._payload(3)
+        payload[1]['price'] = 'not a price'
+        res = self.client.post(BATCH_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [item['status'] for item in res.data], [201, 400, 201])
+        self.assertIn('price', res.data[1]['errors'])
+        self.assertEqual(
+            Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_batch_create_requires_list(self):
+        """
+        Тест: тіло запиту має бути списком
+        """
+        res = self.client.post(BATCH_URL, self._payload(1)[0],
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['detail'], 'Expected a list of recipes.')
+
+    @override_settings(RECIPE_BATCH_MAX_SIZE=2)
+    def test_batch_create_size_limit(self):
+        """
+        Тест: пакет більший за ліміт відхиляється
+        """
+        res = self.client.post(BATCH_URL, self._payload(3), format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data['detail'], 'At most 2 recipes per request.')
+
+    def test_batch_create_invalidates_cache(self):
+        """
+        Тест: пакетне створення інвалідує кеш списку
+        """
+        self.client.get(RECIPES_URL)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(BATCH_URL, self._payload(2), format='json')
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data), 2)
+
+
+class RecipeReadSerializerParityTests(TestCase):
+    """
+    Тести: швидкий список через RecipeReadSerializer віддає той самий
+    JSON, що і RecipeSerializer
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com',
+                                password='testpass123')
+        self.client.force_authenticate(self.user)
+        tags = [Tag.objects.create(user=self.user, name=name)
+                for name in ('Зима', 'Soup', 'Dinner')]
+        ingredients = [Ingredient.objects.create(user=self.user, name=name)
+                       for name in ('Salt', 'Beet', 'Буряк')]
+        prices = [Decimal('0.5'), Decimal('999.99'), Decimal('5'),
+                  Decimal('12.30')]
+        for i, price in enumerate(prices * 2):
+            recipe = create_recipe(
+                user=self.user, title=f'Борщ soup {i}', price=price,
+                link='' if i % 2 else f'https://example.com/{i}')
+            # зв'язки додаються не в порядку id
+            recipe.tags.add(*reversed(tags[:i % 4]))
+            recipe.ingredients.add(*ingredients[i % 3:])
+        self.tag = tags[1]
+
+    def _get_both(self, url, params=None):
+        """
+        Відповіді швидкого і звичайного шляху без кешу відповідей
+        """
+        get_cache().clear()
+        with patch.object(RecipeSerializer, 'to_representation',
+                          side_effect=AssertionError):
+            fast = self.client.get(url, params)
+        get_cache().clear()
+        with patch.object(RecipeViewSet, 'fast_read_actions', ()):
+            slow = self.client.get(url, params)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(slow.status_code, status.HTTP_200_OK)
+        return fast, slow
+
+    def test_list_parity(self):
+        """
+        Тест: однаковий JSON для різних параметрів списку
+        """
+        cases = [
+            {},
+            {'fields': 'id,price,tags'},
+            {'fields': 'title'},
+            {'exclude': 'tags,link'},
+            {'search': 'soup'},
+            {'tags': f'{self.tag.id}', 'facets': 1},
+            {'page_size': 3},
+        ]
+        for params in cases:
+            with self.subTest(params=params):
+                fast, slow = self._get_both(RECIPES_URL, params)
+                self.assertEqual(fast.content, slow.content)
+
+    def test_paginated_parity(self):
+        """
+        Тест: однакові сторінки і курсори при проході всього списку
+        """
+        url = f'{RECIPES_URL}?page_size=3&search=soup'
+        while url:
+            fast, slow = self._get_both(url)
+            self.assertEqual(fast.content, slow.content)
+            url = fast.data['next']
+
+
+class RecipeExportTests(TestCase):
+    """
+    Тести для потокового експорту рецептів
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com',
+                                password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+
+    def _content(self, res):
+        """Тіло потокової відповіді"""
+        self.assertTrue(res.streaming)
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """
+        Тест: NDJSON містить по рецепту на рядок у форматі тіла запиту
+        """
+        recipe = create_recipe(user=self.user, title='Borscht')
+        recipe.tags.add(self.vegan)
+        recipe.ingredients.add(self.salt)
+        create_recipe(user=create_user(email='other@example.com'))
+        res = self.client.get(EXPORT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = self._content(res).splitlines()
+        self.assertEqual(len(lines), 1)
+        item = json.loads(lines[0])
+        self.assertEqual(item['title'], 'Borscht')
+        self.assertEqual(item['price'], '5.00')
+        self.assertEqual(item['tags'], [{'name': 'Vegan'}])
+        self.assertEqual(item['ingredients'], [{'name': 'Salt'}])
+
+    def test_export_csv_with_filter(self):
+        """
+        Тест: CSV з заголовком і фільтром по тегах
+        """
+        recipe = create_recipe(user=self.user, title='Salad')
+        recipe.tags.add(
+            self.vegan, Tag.objects.create(user=self.user, name='Lunch'))
+        create_recipe(user=self.user, title='Steak')
+        res = self.client.get(
+            EXPORT_URL, {'export_format': 'csv', 'tags': self.vegan.id})
+        self.assertTrue(res['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(self._content(res))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Salad')
+        self.assertEqual(rows[0]['tags'], 'Lunch;Vegan')
+        self.assertEqual(rows[0]['ingredients'], '')
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_fetches_relations_per_chunk(self):
+        """
+        Тест: теги і інгредієнти читаються одним запитом на пачку
+        рецептів, а не на рецепт
+        """
+        for i in range(5):
+            create_recipe(user=self.user, title=f'Recipe {i}').tags.add(
+                self.vegan)
+        with CaptureQueriesContext(connection) as queries:
+            content = self._content(self.client.get(EXPORT_URL))
+        self.assertEqual(len(content.splitlines()), 5)
+        # курсор рецептів і по два запити на кожну з трьох пачок
+        self.assertEqual(len(queries), 1 + 3 * 2)
+
+    def test_export_unknown_format(self):
+        """
+        Тест: невідомий формат повертає помилку
+        """
+        res = self.client.get(EXPORT_URL, {'export_format': 'xml'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeCacheTests(TestCase):
+    """
+    Тести для кешу відповідей апі рецептів
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com',
+                                password='testpass123')
+        self.client.force_authenticate(self.user)
+        reset_cache_stats()
+
+    def test_list_served_from_cache(self):
+        """
+        Тест: повторний запит списку не звертається до бази
+        """
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        # лишається тільки агрегат для ETag
+        with self.assertNumQueries(1):
+            cached = self.client.get(RECIPES_URL)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.data, res.data)
+        self.assertEqual(get_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_cache_keyed_by_query_params(self):
+        """
+        Тест: різні параметри запиту кешуються окремо
+        """
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL, {'fields': 'id'})
+        res = self.client.get(RECIPES_URL, {'fields': 'title'})
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(list(res.data[0]), ['title'])
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'api.example.com'])
+    def test_cache_keyed_by_host(self):
+        """
+        Тест: відповідь з абсолютними посиланнями не віддається з кешу
+        для іншого хоста
+        """
+        recipe = create_recipe(user=self.user)
+        Recipe.objects.filter(id=recipe.id).update(
+            image='uploads/recipe/test.jpg')
+        self.client.get(detail_url(recipe.id))
+        res = self.client.get(
+            detail_url(recipe.id), HTTP_HOST='api.example.com')
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertTrue(
+            res.data['image'].startswith('http://api.example.com/'))
+
+    def test_version_bumped_after_commit(self):
+        """
+        Тест: версія користувача змінюється тільки після коміту, тому
+        запит під час транзакції не кешує старі дані під новою версією
+        """
+        version = get_user_version(self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            create_recipe(user=self.user)
+            self.assertEqual(get_user_version(self.user.pk), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_user_version(self.user.pk), version)
+
+    def test_cache_invalidated_on_changes(self):
+        """
+        Тест: зміна рецепта, тегу чи зв'язків інвалідує кеш
+        """
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        changes = [
+            lambda: recipe.tags.add(tag),
+            lambda: Tag.objects.filter(id=tag.id).first().save(),
+            lambda: recipe.tags.clear(),
+            lambda: create_recipe(user=self.user),
+            lambda: recipe.delete(),
+        ]
+        for change in changes:
+            self.client.get(RECIPES_URL)
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            res = self.client.get(RECIPES_URL)
+            self.assertEqual(res['X-Cache'], 'MISS')
+            expected = RecipeSerializer(
+                Recipe.objects.filter(user=self.user).order_by('-id'),
+                many=True)
+            self.assertEqual(res.data, expected.data)
+
+    def test_cache_isolated_between_users(self):
+        """
+        Тест: кеш одного користувача не віддається іншому
+        """
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other_user = create_user(email='other@example.com',
+                                 password='testpass123')
+        self.client.force_authenticate(other_user)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data, [])
+
+
+class ConditionalRequestTests(TestCase):
+    """
+    Тести для ETag і умовних запитів до рецептів
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com',
+                                password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def test_list_not_modified(self):
+        """
+        Тест: список з актуальним ETag повертає 304 без серіалізації
+        """
+        res = self.client.get(RECIPES_URL)
+        self.assertIn('ETag', res)
+        self.assertIn('Last-Modified', res)
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                RECIPES_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(res.content)
+
+    def test_detail_etag_depends_on_representation(self):
+        """
+        Тест: ETag повного тіла не дає 304 на запит з fields, а ETag
+        JSON і msgpack відрізняються
+        """
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+        res = self.client.get(
+            url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.data), ['id'])
+        res = self.client.get(
+            url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_list_etag_depends_on_renderer(self):
+        """
+        Тест: ETag списку JSON не дає 304 на запит msgpack
+        """
+        etag = self.client.get(RECIPES_URL)['ETag']
+        res = self.client.get(
+            RECIPES_URL, HTTP_ACCEPT='application/msgpack',
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_list_not_modified_with_compressed_etag(self):
+        """
+        Тест: слабкий ETag стисненої відповіді теж дає 304
+        """
+        for i in range(10):
+            create_recipe(user=self.user, title=f'Recipe {i}')
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertTrue(res['ETag'].startswith('W/'))
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_NONE_MATCH=res['ETag'],
+            HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_etag_changes_on_m2m_change(self):
+        """
+        Тест: ETag списку змінюється після зміни тегів рецепта
+        """
+        etag = self.client.get(RECIPES_URL)['ETag']
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_detail_not_modified(self):
+        """
+        Тест: деталі з актуальним ETag чи датою повертають 304
+        """
+        url = detail_url(self.recipe.id)
+        res = self.client.get(url)
+        res_etag = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res_etag.status_code, status.HTTP_304_NOT_MODIFIED)
+        res_date = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+        self.assertEqual(res_date.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_on_tag_rename(self):
+        """
+        Тест: перейменування тегу змінює ETag рецептів з цим тегом
+        """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(tag)
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+        tag.name = 'Vegetarian'
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegetarian')
+
+    def test_update_if_match(self):
+        """
+        Тест: оновлення з застарілим If-Match повертає 412
+        """
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+        res = self.client.patch(url, {'title': 'First'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        res = self.client.patch(url, {'title': 'Second'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'First')
+
 
 class ImageUploadTests(TestCase):
     """
@@ -426,6 +1347,11 @@ class ImageUploadTests(TestCase):
     """
 
     def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        media = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        media.enable()
+        self.addCleanup(media.disable)
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             'user@21example.com',
@@ -434,8 +1360,18 @@ class ImageUploadTests(TestCase):
         self.client.force_authenticate(self.user)
         self.recipe = create_recipe(user=self.user)
 
-    def tearDown(self):
-        self.recipe.image.delete()
+    def _upload_image(self, size=(10, 10), image_format='JPEG',
+                      content=None):
+        """Завантажує зображення заданого розміру або готові байти"""
+        if content is None:
+            buffer = io.BytesIO()
+            Image.new('RGB', size).save(buffer, format=image_format)
+            content = buffer.getvalue()
+        image_file = io.BytesIO(content)
+        image_file.name = f'image.{image_format.lower()}'
+        return self.client.post(
+            image_upload_url(self.recipe.id), {'image': image_file},
+            format='multipart')
 
     def test_upload_image(self):
         """
@@ -460,3 +1396,543 @@ class ImageUploadTests(TestCase):
         url = image_upload_url(self.recipe.id)
         res = self.client.post(url, {'image': 'notimage'}, format='multipart')
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_IMAGE_WORKERS=1)
+    def test_broken_pool_does_not_fail_upload(self):
+        """
+        Тест: зламаний пул процесів не дає 500 після збереження
+        оригіналу, а наступне завантаження створить новий пул
+        """
+        broken = Mock()
+        broken.submit.side_effect = BrokenProcessPool()
+        with patch.object(variants, '_executor', broken):
+            with self.assertLogs('recipe.variants', 'ERROR'), \
+                    self.captureOnCommitCallbacks(execute=True):
+                res = self._upload_image()
+            self.assertIsNone(variants._executor)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertEqual(self.recipe.image_variants, {})
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    def test_variants_error_does_not_fail_upload(self):
+        """
+        Тест: помилка генерації варіантів в запиті тільки логується
+        """
+        with patch('recipe.variants.generate_variants',
+                   side_effect=OSError()), \
+                self.assertLogs('recipe.variants', 'ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            res = self._upload_image()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_upload_image_returns_before_variants(self):
+        """
+        Тест: відповідь не чекає на генерацію зменшених копій
+        """
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self._upload_image()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(enqueue_image_variants,
+                      [callback.func for callback in callbacks])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    def test_upload_image_generates_variants(self):
+        """
+        Тест: після завантаження генеруються зменшені копії, які є в
+        деталях рецепта
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload_image(size=(600, 400))
+
+        self.recipe.refresh_from_db()
+        sizes = {
+            name: (variant['width'], variant['height'])
+            for name, variant in self.recipe.image_variants.items()
+        }
+        self.assertEqual(sizes, {
+            'thumbnail': (150, 150),
+            'small': (480, 320),
+            'medium': (600, 400),
+        })
+        for variant in self.recipe.image_variants.values():
+            self.assertTrue(default_storage.exists(variant['path']))
+        res = self.client.get(detail_url(self.recipe.id))
+        thumbnail = res.data['image_variants']['thumbnail']
+        self.assertTrue(thumbnail['url'].endswith(
+            self.recipe.image_variants['thumbnail']['path']))
+        self.assertEqual(thumbnail['width'], 150)
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    def test_same_image_shared_between_recipes(self):
+        """
+        Тест: однакове зображення двох рецептів зберігається одним файлом
+        за хешем вмісту, а варіанти не генеруються повторно
+        """
+        content = noise_jpeg((300, 200))
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload_image(content=content)
+        other = self.recipe
+        self.recipe = create_recipe(user=self.user)
+        with patch('recipe.variants.generate_variants') as generate, \
+                self.captureOnCommitCallbacks(execute=True):
+            res = self._upload_image(content=content)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        generate.assert_not_called()
+        other.refresh_from_db()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, other.image.name)
+        self.assertRegex(
+            self.recipe.image.name,
+            r'^uploads/recipe/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpeg$')
+        self.assertEqual(self.recipe.image_variants, other.image_variants)
+        self.assertEqual(
+            StoredImage.objects.get(pk=self.recipe.image.name).ref_count, 2)
+
+    def test_variants_of_replaced_image_not_saved(self):
+        """
+        Тест: варіанти старого зображення не записуються після заміни
+        """
+        saved = save_variants(
+            self.recipe.id, self.user.id, 'uploads/recipe/old.jpg',
+            {'thumbnail': {'name': 'old.jpg', 'width': 1, 'height': 1}})
+
+        self.assertFalse(saved)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_upload_image_too_large_content_length(self):
+        """
+        Тест: завеликий запит відхиляється за Content-Length з 413
+        """
+        content = noise_jpeg((300, 300))
+        with override_settings(RECIPE_IMAGE_MAX_BYTES=1024):
+            res = self._upload_image(content=content)
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_image_too_large_file(self):
+        """
+        Тест: файл більший за ліміт відхиляється при читанні з 413
+        """
+        content = noise_jpeg((300, 300))
+        with override_settings(RECIPE_IMAGE_MAX_BYTES=len(content) - 1):
+            res = self._upload_image(content=content)
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_upload_image_too_many_pixels(self):
+        """
+        Тест: розміри з заголовка перевіряються без декодування, в тому
+        числі для decompression bomb
+        """
+        for width, height in ((8000, 8000), (50000, 50000)):
+            content = png_header(width, height)
+            with patch.object(Image.Image, 'load') as load:
+                res = self._upload_image(image_format='PNG', content=content)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('image', res.data)
+            load.assert_not_called()
+
+    def test_upload_image_unsupported_format(self):
+        """
+        Тест: формат не з RECIPE_IMAGE_FORMATS відхиляється
+        """
+        res = self._upload_image(image_format='BMP')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('BMP', str(res.data['image']))
+
+
+class RecipeMediaTests(TestCase):
+    """
+    Тести віддачі зображень рецептів
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        media = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.content = bytes(range(256)) * 4
+        self.recipe.image.save('image.jpg', ContentFile(self.content))
+
+    def _get(self, name=None, **headers):
+        """GET запит файлу"""
+        return self.client.get(
+            media_url(name or self.recipe.image.name), **headers)
+
+    def test_owner_gets_image(self):
+        """
+        Тест: власник отримує файл з заголовками для довгого кешування
+        """
+        res = self._get()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], str(len(self.content)))
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('private', res['Cache-Control'])
+        self.assertTrue(res.has_header('Last-Modified'))
+
+    def test_image_accept_header(self):
+        """
+        Тест: Accept браузера для зображень не дає 406
+        """
+        for accept in ('image/jpeg', 'image/webp,image/*'):
+            res = self._get(HTTP_ACCEPT=accept)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res['Content-Type'], 'image/jpeg')
+            self.assertEqual(
+                b''.join(res.streaming_content), self.content)
+
+    def test_not_found_with_image_accept_header(self):
+        """
+        Тест: помилка при Accept: image/* віддається як JSON
+        """
+        res = self._get('uploads/recipe/missing.jpg',
+                        HTTP_ACCEPT='image/webp,image/*')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(res['Content-Type'], 'application/json')
+
+    def test_other_user_not_found(self):
+        """
+        Тест: чужий файл, файл не рецепта і шлях за межі медіа дають 404
+        """
+        other = create_user(email='other@example.com', password='test123')
+        self.client.force_authenticate(other)
+        self.assertEqual(
+            self._get().status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(self.user)
+        for name in ('uploads/other/file.jpg',
+                     f'uploads/recipe/../../{self.recipe.image.name}'):
+            self.assertEqual(
+                self._get(name).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_auth_required(self):
+        """
+        Тест: без автентифікації файл не віддається
+        """
+        self.client.force_authenticate(None)
+
+        self.assertEqual(
+            self._get().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_range(self):
+        """
+        Тест: Range віддає частину файлу з 206
+        """
+        res = self._get(HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), self.content[10:20])
+        self.assertEqual(res['Content-Length'], '10')
+        self.assertEqual(
+            res['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        res = self._get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(res.streaming_content), self.content[-5:])
+        res = self._get(HTTP_RANGE='bytes=1000-5000')
+        self.assertEqual(b''.join(res.streaming_content), self.content[1000:])
+
+    def test_range_not_satisfiable(self):
+        """
+        Тест: діапазон за межами файлу дає 416
+        """
+        res = self._get(HTTP_RANGE=f'bytes={len(self.content)}-')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(res['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_multiple_ranges_and_stale_if_range(self):
+        """
+        Тест: кілька діапазонів чи застарілий If-Range віддають весь файл
+        """
+        for headers in (
+                {'HTTP_RANGE': 'bytes=0-1,5-6'},
+                {'HTTP_RANGE': 'bytes=0-1',
+                 'HTTP_IF_RANGE': 'Mon, 01 Jan 2001 00:00:00 GMT'}):
+            res = self._get(**headers)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(b''.join(res.streaming_content), self.content)
+
+    def test_if_modified_since(self):
+        """
+        Тест: незмінений файл дає 304 без тіла
+        """
+        last_modified = self._get()['Last-Modified']
+        res = self._get(HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('immutable', res['Cache-Control'])
+
+    def test_variant_of_owned_image(self):
+        """
+        Тест: варіант віддається власнику оригіналу
+        """
+        stem = os.path.splitext(os.path.basename(self.recipe.image.name))[0]
+        name = default_storage.save(
+            f'uploads/recipe/variants/{stem}_thumbnail.jpg',
+            ContentFile(b'thumbnail'))
+
+        res = self._get(name)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'thumbnail')
+        self.assertEqual(
+            self._get(f'uploads/recipe/variants/{stem}_huge.jpg').status_code,
+            status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='nginx')
+    def test_x_accel_redirect(self):
+        """
+        Тест: з nginx файл віддає проксі через X-Accel-Redirect
+        """
+        res = self._get()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'/protected/media/{self.recipe.image.name}')
+        self.assertIn('immutable', res['Cache-Control'])
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='apache')
+    def test_x_sendfile(self):
+        """
+        Тест: з apache файл віддає проксі через X-Sendfile
+        """
+        res = self._get()
+
+        self.assertEqual(res['X-Sendfile'], self.recipe.image.path)
+        self.assertEqual(res.content, b'')
+
+
+def resized_image_url(recipe_id, **params):
+    """Повертає URL копії зображення рецепта"""
+    url = reverse('recipe:recipe-resized-image', args=[recipe_id])
+    return f'{url}?{urlencode(params)}'
+
+
+class RecipeResizedImageTests(TestCase):
+    """
+    Тести копій зображень рецептів на запит
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        media = override_settings(
+            MEDIA_ROOT=os.path.join(self.tmpdir.name, 'media'),
+            RECIPE_IMAGE_RESIZE_CACHE_DIR=os.path.join(
+                self.tmpdir.name, 'resized'))
+        media.enable()
+        self.addCleanup(media.disable)
+        reset_resize_stats()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.recipe.image.save(
+            'image.jpg', ContentFile(noise_jpeg((600, 400))))
+
+    def _get(self, width=160, accept='image/webp,image/*,*/*;q=0.8',
+             **headers):
+        """Запит копії зображення"""
+        return self.client.get(
+            resized_image_url(self.recipe.id, width=width),
+            HTTP_ACCEPT=accept, **headers)
+
+    def test_webp_negotiated(self):
+        """
+        Тест: з image/webp в Accept віддається WebP потрібної ширини
+        """
+        res = self._get()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertIn('Accept', res['Vary'])
+        with Image.open(io.BytesIO(b''.join(res.streaming_content))) as img:
+            self.assertEqual(img.format, 'WEBP')
+            self.assertEqual(img.size, (160, 107))
+
+    def test_jpeg_by_default(self):
+        """
+        Тест: без WebP в Accept віддається JPEG
+        """
+        for accept in ('*/*', 'image/jpeg'):
+            res = self._get(accept=accept)
+            self.assertEqual(res['Content-Type'], 'image/jpeg')
+            with Image.open(
+                    io.BytesIO(b''.join(res.streaming_content))) as img:
+                self.assertEqual(img.format, 'JPEG')
+
+    def test_cache_hit(self):
+        """
+        Тест: повторний запит бере копію з кешу без генерації
+        """
+        b''.join(self._get().streaming_content)
+        with patch('recipe.resize.save_resized') as save:
+            res = self._get()
+            b''.join(res.streaming_content)
+
+        save.assert_not_called()
+        stats = get_resize_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertGreater(stats['generation_p99_ms'], 0)
+
+    def test_not_modified(self):
+        """
+        Тест: If-None-Match з актуальним ETag дає 304
+        """
+        etag = self._get()['ETag']
+        res = self._get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_width_not_allowed(self):
+        """
+        Тест: ширина не з дозволеного списку дає 400 з JSON
+        """
+        res = self._get(width=123)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertIn('width', json.loads(res.content))
+
+    def test_no_image_or_other_user(self):
+        """
+        Тест: рецепт без зображення і чужий рецепт дають 404
+        """
+        self.recipe.image = None
+        self.recipe.save()
+        self.assertEqual(
+            self._get().status_code, status.HTTP_404_NOT_FOUND)
+        other = create_user(email='other@example.com', password='test123')
+        self.recipe = create_recipe(user=other)
+        self.assertEqual(
+            self._get().status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_single_generation_under_concurrency(self):
+        """
+        Тест: паралельні запити однієї копії генерують її один раз
+        """
+        barrier = threading.Barrier(8)
+
+        def fetch():
+            barrier.wait()
+            get_resized_image(
+                self.recipe.image.name, 320, WebPRenderer()).close()
+
+        with patch('recipe.resize.save_resized',
+                   wraps=resize.save_resized) as save:
+            threads = [threading.Thread(target=fetch) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(save.call_count, 1)
+
+    def test_evict_least_recently_used(self):
+        """
+        Тест: витіснення видаляє найдавніше використані копії
+        """
+        cache_dir = settings.RECIPE_IMAGE_RESIZE_CACHE_DIR
+        paths = []
+        for i in range(5):
+            path = os.path.join(cache_dir, 'ab', f'{i}.jpg')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as stream:
+                stream.write(b'x' * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+            paths.append(path)
+        os.utime(paths[0], (2000, 2000))
+
+        removed = resize.evict(cache_dir, max_bytes=400)
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(
+            [os.path.exists(path) for path in paths],
+            [True, False, False, True, True])
+
+
+class MessagePackApiTests(TestCase):
+    """
+    Тести для перевірки формату MessagePack через Accept і Content-Type
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com',
+                                password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_list_recipes_msgpack(self):
+        """
+        Тест що список рецептів у MessagePack збігається з JSON
+        """
+        recipe = create_recipe(user=self.user, price=Decimal('5.50'))
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        res_json = self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertIn('Accept', res['Vary'])
+        self.assertEqual(msgpack.unpackb(res.content),
+                         json.loads(res_json.content))
+
+    def test_create_recipe_msgpack(self):
+        """
+        Тест для створення рецепта з тілом у MessagePack
+        """
+        payload = {
+            'title': 'Борщ',
+            'time_minutes': 30,
+            'price': '5.50',
+            'tags': [{'name': 'Soup'}],
+        }
+        res = self.client.post(
+            RECIPES_URL, msgpack.packb(payload),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=msgpack.unpackb(res.content)['id'])
+        self.assertEqual(recipe.title, payload['title'])
+        self.assertEqual(recipe.price, Decimal('5.50'))
+        self.assertEqual(recipe.tags.get().name, 'Soup')
+
+    def test_create_recipe_invalid_msgpack(self):
+        """
+        Тест що некоректний MessagePack повертає 400
+        """
+        res = self.client.post(
+            RECIPES_URL, b'\xc1', content_type='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
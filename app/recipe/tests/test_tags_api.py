@@ -9,9 +9,11 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Tag, Recipe
-from recipe.serializers import TagSerializer
+from recipe.autocomplete import autocomplete_cache
+from recipe.serializers import TagDetailSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
+AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
 
 
 def detail_url(tag_id):
@@ -63,7 +65,7 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL)
         tags = Tag.objects.all().order_by('-name')
-        serializer = TagSerializer(tags, many=True)
+        serializer = TagDetailSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
@@ -120,8 +122,9 @@ class PrivateTagsApiTests(TestCase):
         )
         recipe.tags.add(tag1)
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
-        serializer1 = TagSerializer(tag1)
-        serializer2 = TagSerializer(tag2)
+        tag1.refresh_from_db()
+        serializer1 = TagDetailSerializer(tag1)
+        serializer2 = TagDetailSerializer(tag2)
         self.assertIn(serializer1.data, res.data)
         self.assertNotIn(serializer2.data, res.data)
 
@@ -147,3 +150,111 @@ class PrivateTagsApiTests(TestCase):
         recipe2.tags.add(tag)
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
         self.assertEqual(len(res.data), 1)
+
+    def test_tags_recipe_count(self):
+        """
+        Тест: список тегів повертає кількість рецептів з тегом
+        """
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        for title in ('Eggs on toast', 'Porridge'):
+            Recipe.objects.create(
+                title=title,
+                time_minutes=5,
+                price=Decimal('3.00'),
+                user=self.user
+            ).tags.add(tag)
+        Recipe.objects.filter(title='Porridge').delete()
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data[0]['recipe_count'], 1)
+
+    def test_tags_cursor_pagination(self):
+        """
+        Тест для перевірки курсорної пагінації тегів
+        """
+        for name in ('Vegan', 'Dessert', 'Breakfast'):
+            Tag.objects.create(user=self.user, name=name)
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [item['name'] for item in res.data['results']]
+        self.assertEqual(names, ['Vegan', 'Dessert'])
+        res = self.client.get(res.data['next'])
+        names = [item['name'] for item in res.data['results']]
+        self.assertEqual(names, ['Breakfast'])
+        self.assertIsNone(res.data['next'])
+
+    def test_tags_list_cache_invalidated_on_update(self):
+        """
+        Тест: після оновлення тега список тегів не віддається з кешу
+        """
+        tag = Tag.objects.create(user=self.user, name='Afters')
+        self.client.get(TAGS_URL)
+        self.assertEqual(self.client.get(TAGS_URL)['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url(tag.id), {'name': 'Dinner'})
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data[0]['name'], 'Dinner')
+
+
+class TagsAutocompleteTests(TestCase):
+    """
+    Тести для автодоповнення тегів
+    """
+
+    def setUp(self):
+        autocomplete_cache.clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_autocomplete_prefix_matches_first(self):
+        """
+        Тест: збіги по префіксу йдуть перед схожими назвами
+        """
+        for name in ('Bread', 'Breakfast', 'Dinner', 'Sweet bread'):
+            Tag.objects.create(user=self.user, name=name)
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'brea'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [item['name'] for item in res.data]
+        self.assertEqual(names[:2], ['Bread', 'Breakfast'])
+        self.assertNotIn('Dinner', names)
+
+    def test_autocomplete_fuzzy_match(self):
+        """
+        Тест: назва знаходиться з одруківкою
+        """
+        Tag.objects.create(user=self.user, name='Dessert')
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'desert'})
+        self.assertEqual([item['name'] for item in res.data], ['Dessert'])
+
+    def test_autocomplete_limited_to_user(self):
+        """
+        Тест: підказки тільки з тегів користувача і не більше limit
+        """
+        other = create_user(email='other@example.com')
+        Tag.objects.create(user=other, name='Vegan')
+        Tag.objects.create(user=self.user, name='Vegetarian')
+        Tag.objects.create(user=self.user, name='Veggie')
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'veg', 'limit': 1})
+        self.assertEqual(len(res.data), 1)
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'veg'})
+        names = {item['name'] for item in res.data}
+        self.assertEqual(names, {'Vegetarian', 'Veggie'})
+
+    def test_autocomplete_cached_until_tags_change(self):
+        """
+        Тест: повторний запит береться з LRU без запитів до бази, а
+        зміна тега скидає кеш
+        """
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        self.assertEqual(
+            self.client.get(AUTOCOMPLETE_URL, {'q': 'lun'})['X-Cache'],
+            'MISS')
+        with self.assertNumQueries(0):
+            res = self.client.get(AUTOCOMPLETE_URL, {'q': 'LUN'})
+        self.assertEqual(res['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url(tag.id), {'name': 'Lunchbox'})
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'lun'})
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data[0]['name'], 'Lunchbox')
@@ -0,0 +1,121 @@
+"""
+Потокове завантаження зображень рецептів з ранньою відмовою для
+завеликих файлів
+"""
+import io
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.parsers import MultiPartParser
+
+# запас на заголовки і межі multipart поверх розміру файлу
+MULTIPART_OVERHEAD = 64 * 1024
+# скільки байтів початку файлу читається для розпізнавання заголовка
+IMAGE_HEADER_MAX_BYTES = 256 * 1024
+
+
+class RequestEntityTooLarge(APIException):
+    """
+    Тіло запиту більше за дозволений розмір
+    """
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Request body is too large.'
+    default_code = 'request_entity_too_large'
+
+
+def read_image_size(header):
+    """
+    Формат і розміри зображення з початку файлу без декодування пікселів
+    або None, якщо заголовок ще неповний
+    """
+    try:
+        with Image.open(io.BytesIO(header)) as image:
+            return image.format, image.size
+    except (OSError, SyntaxError):
+        return None
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пише файл на диск частинами і відмовляє, щойно стає відомо, що
+    файл завеликий за байтами чи пікселями: за Content-Length до читання
+    тіла, за лічильником байтів або за заголовком зображення
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        """
+        Відмовляє за Content-Length, не читаючи тіло запиту
+        """
+        limit = settings.RECIPE_IMAGE_MAX_BYTES + MULTIPART_OVERHEAD
+        if content_length > limit:
+            raise RequestEntityTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        """
+        Новий тимчасовий файл і буфер для заголовка зображення
+        """
+        super().new_file(*args, **kwargs)
+        self.header = bytearray()
+        self.checked = False
+
+    def _reject(self, exc):
+        """
+        Видаляє тимчасовий файл і перериває завантаження
+        """
+        self.upload_interrupted()
+        raise exc
+
+    def _check_header(self):
+        """
+        Перевіряє формат і розміри, щойно заголовок зображення прочитано
+        """
+        try:
+            result = read_image_size(bytes(self.header))
+        except Image.DecompressionBombError:
+            # розміри більші навіть за ліміт самого Pillow
+            self._reject(ValidationError(
+                {self.field_name: ['Image is too large.']}))
+        if result is None:
+            if len(self.header) >= IMAGE_HEADER_MAX_BYTES:
+                self._reject(ValidationError(
+                    {self.field_name: ['Upload a valid image.']}))
+            return
+        image_format, (width, height) = result
+        if image_format not in settings.RECIPE_IMAGE_FORMATS:
+            self._reject(ValidationError({self.field_name: [
+                f'Unsupported image format: {image_format}.']}))
+        if (max(width, height) > settings.RECIPE_IMAGE_MAX_SIDE
+                or width * height > settings.RECIPE_IMAGE_MAX_PIXELS):
+            self._reject(ValidationError({self.field_name: [
+                f'Image is too large: {width}x{height} pixels.']}))
+        self.checked = True
+        self.header = None
+
+    def receive_data_chunk(self, raw_data, start):
+        """
+        Пише частину на диск, перевіряючи розмір і заголовок
+        """
+        if start + len(raw_data) > settings.RECIPE_IMAGE_MAX_BYTES:
+            self._reject(RequestEntityTooLarge())
+        if not self.checked:
+            self.header += raw_data[:IMAGE_HEADER_MAX_BYTES]
+            self._check_header()
+        return super().receive_data_chunk(raw_data, start)
+
+
+class ImageUploadParser(MultiPartParser):
+    """
+    Multipart парсер, що приймає файли через ImageUploadHandler
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Розбирає тіло запиту з обмеженнями для зображень
+        """
+        request = parser_context['request']
+        request.upload_handlers = [ImageUploadHandler(request._request)]
+        return super().parse(stream, media_type, parser_context)
@@ -0,0 +1,167 @@
+"""
+Фонова генерація варіантів зображень рецептів у пулі процесів
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Recipe
+from recipe.cache import bump_user_version
+from recipe.images import VARIANT_EXTENSION, generate_variants
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = os.path.join('uploads', 'recipe', 'variants')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Пул процесів, створюється при першому використанні. Процеси
+    запускаються через spawn, бо fork потоків сервера небезпечний
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _executor
+
+
+def _reset_executor(executor):
+    """
+    Забуває пул, у якому загинув процес (наприклад, через OOM): такий
+    пул не приймає задач, тому наступний виклик get_executor створить
+    новий
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+
+
+def save_variants(recipe_id, user_id, image_name, variants):
+    """
+    Зберігає варіанти, якщо зображення рецепта не замінили за час
+    генерації. Повертає True, якщо варіанти збережено
+    """
+    updated = Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_variants={
+            name: {
+                'path': os.path.join(VARIANTS_DIR, variant['name']),
+                'width': variant['width'],
+                'height': variant['height'],
+            }
+            for name, variant in variants.items()
+        },
+        updated_at=timezone.now(),
+    )
+    if updated:
+        # update() не викликає сигналів моделі
+        transaction.on_commit(partial(bump_user_version, user_id))
+    return bool(updated)
+
+
+def _on_variants_done(executor, recipe_id, user_id, image_name, future):
+    """
+    Зберігає результат пулу, виконується в потоці пулу
+    """
+    try:
+        save_variants(recipe_id, user_id, image_name, future.result())
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        logger.exception(
+            'Image variants for recipe %s were not generated', recipe_id)
+    except Exception:
+        logger.exception(
+            'Image variants for recipe %s were not generated', recipe_id)
+    finally:
+        connection.close()
+
+
+def variant_paths(image_name):
+    """
+    Шляхи всіх варіантів зображення в сховищі
+    """
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return [
+        os.path.join(VARIANTS_DIR, f'{stem}_{name}{VARIANT_EXTENSION}')
+        for name in settings.RECIPE_IMAGE_VARIANTS
+    ]
+
+
+def copy_shared_variants(recipe):
+    """
+    Бере готові варіанти з іншого рецепта з тим самим файлом зображення.
+    Повертає True, якщо варіанти знайдено
+    """
+    variants = Recipe.objects.filter(image=recipe.image.name).exclude(
+        pk=recipe.pk).exclude(image_variants={}).values_list(
+        'image_variants', flat=True).first()
+    if variants is None or set(variants) != set(
+            settings.RECIPE_IMAGE_VARIANTS):
+        return False
+    if not all(default_storage.exists(variant['path'])
+               for variant in variants.values()):
+        return False
+    return save_variants(
+        recipe.pk, recipe.user_id, recipe.image.name,
+        {name: dict(variant, name=os.path.basename(variant['path']))
+         for name, variant in variants.items()})
+
+
+def enqueue_image_variants(recipe):
+    """
+    Ставить генерацію варіантів зображення рецепта в пул процесів і
+    повертає future. При RECIPE_IMAGE_WORKERS = 0 варіанти генеруються
+    і зберігаються одразу. Варіанти файлу, спільного з іншим рецептом,
+    не генеруються повторно. Викликається після коміту в запиті, тому
+    помилки тільки логуються: оригінал уже збережено
+    """
+    try:
+        return _enqueue_image_variants(recipe)
+    except Exception:
+        logger.exception(
+            'Image variants for recipe %s were not generated', recipe.pk)
+        return None
+
+
+def _enqueue_image_variants(recipe):
+    """
+    Генерує варіанти одразу або ставить їх в пул
+    """
+    if copy_shared_variants(recipe):
+        return None
+    args = (
+        default_storage.path(recipe.image.name),
+        default_storage.path(VARIANTS_DIR),
+        os.path.splitext(os.path.basename(recipe.image.name))[0],
+        settings.RECIPE_IMAGE_VARIANTS,
+    )
+    if not settings.RECIPE_IMAGE_WORKERS:
+        save_variants(recipe.pk, recipe.user_id, recipe.image.name,
+                      generate_variants(*args))
+        return None
+    executor = get_executor()
+    try:
+        future = executor.submit(generate_variants, *args)
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        raise
+    future.add_done_callback(partial(
+        _on_variants_done, executor, recipe.pk, recipe.user_id,
+        recipe.image.name))
+    return future
@@ -1,15 +1,50 @@
 """
 Вью для рецептів
 """
+import os
+from functools import partial
+
 from drf_spectacular.utils import extend_schema_view, extend_schema, \
     OpenApiParameter, OpenApiTypes
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, \
+    StreamingHttpResponse
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Count, DecimalField, Exists, F, OuterRef, \
+    Prefetch
+from django.db.models.functions import Cast
 from core.models import Recipe, Tag, Ingredient
+from core.renderers import JPEGRenderer, WebPRenderer
 from recipe import serializers
+from recipe.pagination import KeysetCursorPagination
+from recipe.cache import CachedResponseMixin, CachedRetrieveMixin, \
+    bump_user_version
+from recipe.conditional import ConditionalRequestMixin, etag_matches, \
+    make_etag
+from recipe.autocomplete import AutocompleteMixin
+from recipe.facets import FacetedListMixin
+from recipe.export import EXPORT_FORMATS
+from recipe.resize import get_resized_image
+from recipe.uploads import ImageUploadParser
+from recipe.variants import enqueue_image_variants
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Список полів, які потрібно повернути', ),
+    OpenApiParameter(
+        'exclude',
+        OpenApiTypes.STR,
+        description='Список полів, які потрібно пропустити', ),
+]
 
 
 @extend_schema_view(
@@ -23,10 +58,33 @@ from recipe import serializers
                 'ingredients',
                 OpenApiTypes.STR,
                 description='Список інгредієнтів для фільтрації', ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description='any - рецепти з будь-яким з тегів/інгредієнтів, '
+                            'all - рецепти з усіма', ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='Повнотекстовий пошук по назві, опису, тегах і '
+                            'інгредієнтах, результати сортуються по '
+                            'релевантності', ),
+            OpenApiParameter(
+                'facets',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='Додає до відповіді кількість знайдених '
+                            'рецептів для кожного тегу і інгредієнта', ),
+            *SPARSE_FIELDS_PARAMETERS,
         ],
+        # список читається через RecipeReadSerializer з тими ж полями
+        responses=serializers.RecipeSerializer(many=True),
     ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalRequestMixin,
+                    CachedRetrieveMixin,
+                    FacetedListMixin,
+                    viewsets.ModelViewSet):
     """
     Вью для рецептів
     """
@@ -34,6 +92,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetCursorPagination
+    ordering = ('-id',)
+    # дії, що читають рецепти через values() і RecipeReadSerializer
+    fast_read_actions = ('list',)
 
     def _params_to_ints(self, qs):
         """
@@ -41,28 +103,174 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _get_serializer_fields(self):
+        """
+        Повертає всі поля серіалізатора поточної дії
+        """
+        serializer_class = self.get_serializer_class()
+        # швидкий серіалізатор бере поля зі свого serializer_class
+        serializer_class = getattr(
+            serializer_class, 'serializer_class', serializer_class)
+        return serializer_class.Meta.fields
+
+    def _parse_field_names(self, param):
+        """
+        Назви полів з параметра запиту або None, якщо він порожній.
+        Невідомі назви дають 400
+        """
+        value = self.request.query_params.get(param)
+        names = [name for name in (value or '').split(',') if name]
+        if not names:
+            return None
+        unknown = [name for name in names
+                   if name not in self._get_serializer_fields()]
+        if unknown:
+            raise ValidationError(
+                {param: [f'Unknown fields: {", ".join(unknown)}.']})
+        return names
+
+    def _get_sparse_fields(self):
+        """
+        Повертає поля з параметрів fields/exclude для читання рецептів
+        """
+        if self.action not in ('list', 'retrieve'):
+            return None, None
+        return (self._parse_field_names('fields'),
+                self._parse_field_names('exclude'))
+
+    def _get_rendered_fields(self):
+        """
+        Повертає поля, які серіалізатор віддасть клієнту
+        """
+        rendered = self._get_serializer_fields()
+        fields, exclude = self._get_sparse_fields()
+        if fields is not None:
+            rendered = [name for name in rendered if name in fields]
+        if exclude is not None:
+            rendered = [name for name in rendered if name not in exclude]
+        return rendered
+
+    def _filter_by_related(self, queryset, through, field, ids):
+        """
+        Фільтрує рецепти по зв'язаних об'єктах через напівз'єднання
+        (EXISTS / IN) з проміжною таблицею, тому DISTINCT не потрібен
+        """
+        rows = through.objects.filter(**{f'{field}__in': ids})
+        if self.request.query_params.get('match') == 'all':
+            matched = rows.values('recipe_id').annotate(
+                matched=Count(field)).filter(
+                matched=len(set(ids))).values('recipe_id')
+            return queryset.filter(id__in=matched)
+        return queryset.filter(Exists(rows.filter(recipe_id=OuterRef('pk'))))
+
+    def get_ordering(self):
+        """
+        Сортування рецептів: по релевантності при пошуку, інакше по -id
+        """
+        if self.request.query_params.get('search'):
+            return ('-rank', '-id')
+        return self.ordering
+
+    def _search(self, queryset, search):
+        """
+        Повнотекстовий пошук по вектору рецепта з GIN індексом
+        """
+        query = SearchQuery(search, config='simple', search_type='websearch')
+        # numeric замість real, щоб позиція в курсорі точно збігалась
+        rank = Cast(SearchRank(F('search_vector'), query),
+                    DecimalField(max_digits=12, decimal_places=6))
+        return queryset.filter(search_vector=query).annotate(rank=rank)
+
     def get_queryset(self):
         """
         Отримання рецептів для поточного користувача
         """
+        search = self.request.query_params.get('search')
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
+        if search:
+            queryset = self._search(queryset, search)
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = self._filter_by_related(
+                queryset, Recipe.tags.through, 'tag_id', tag_ids)
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-
+            queryset = self._filter_by_related(
+                queryset, Recipe.ingredients.through, 'ingredient_id',
+                ingredient_ids)
+        if self.action in self.fast_read_actions:
+            queryset = self._select_values(queryset, search)
+        elif self.action in ('list', 'retrieve'):
+            queryset = self._select_rendered_fields(queryset)
+        elif self.action == 'resized_image':
+            queryset = queryset.only('id', 'image')
+        elif self.action != 'export':
+            # експорт завантажує зв'язки сам, пачками
+            queryset = self._prefetch_related(queryset)
         return queryset.filter(
-            user=self.request.user).order_by("-id").distinct()
+            user=self.request.user).order_by(*self.get_ordering())
+
+    def _prefetch_related(self, queryset, names=('tags', 'ingredients')):
+        """
+        Завантажує теги і інгредієнти рецептів фіксованою кількістю запитів
+        """
+        prefetches = {
+            'tags': Prefetch(
+                'tags',
+                queryset=Tag.objects.only('id', 'name').order_by('id')),
+            'ingredients': Prefetch(
+                'ingredients',
+                queryset=Ingredient.objects.only(
+                    'id', 'name').order_by('id')),
+        }
+        return queryset.prefetch_related(
+            *[prefetches[name] for name in names])
+
+    def _select_rendered_fields(self, queryset):
+        """
+        Вибирає з бази тільки колонки і зв'язки, які потрібні для відповіді
+        """
+        rendered = self._get_rendered_fields()
+        columns = [
+            field.name for field in Recipe._meta.concrete_fields
+            if field.name in rendered
+        ]
+        queryset = queryset.only('id', *columns)
+        return self._prefetch_related(queryset, [
+            name for name in ('tags', 'ingredients') if name in rendered
+        ])
+
+    def _select_values(self, queryset, search):
+        """
+        Рядки values() з колонками для RecipeReadSerializer; при пошуку
+        також rank, бо по ньому будується позиція курсора
+        """
+        columns = serializers.RecipeReadSerializer.get_value_fields(
+            self._get_rendered_fields())
+        if search:
+            columns.append('rank')
+        return queryset.values(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Передає в серіалізатор поля з параметрів fields/exclude
+        """
+        fields, exclude = self._get_sparse_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        if exclude is not None:
+            kwargs.setdefault('exclude', exclude)
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_class(self):
         """
         Повертає серіалізатор для деталей рецепта
         """
-        if self.action == 'list':
+        if self.action in self.fast_read_actions:
+            return serializers.RecipeReadSerializer
+        if self.action in ('list', 'batch'):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
@@ -74,10 +282,106 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    @extend_schema(
+        request=serializers.RecipeSerializer(many=True),
+        responses={
+            201: OpenApiTypes.OBJECT,
+            207: OpenApiTypes.OBJECT,
+            400: OpenApiTypes.OBJECT,
+        },
+    )
+    @action(methods=['POST'], detail=False, url_path='batch')
+    def batch(self, request):
+        """
+        Пакетне створення рецептів з результатом для кожного елемента
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a list of recipes.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > settings.RECIPE_BATCH_MAX_SIZE:
+            return Response(
+                {'detail': f'At most {settings.RECIPE_BATCH_MAX_SIZE} '
+                           f'recipes per request.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        results = [None] * len(items)
+        valid_indexes, valid_data = [], []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid_indexes.append(index)
+                valid_data.append(serializer.validated_data)
+            else:
+                results[index] = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': serializer.errors,
+                }
+        if valid_data:
+            recipes = self.get_serializer(many=True).create(valid_data)
+            # пакетна вставка не викликає сигналів моделей
+            transaction.on_commit(
+                partial(bump_user_version, request.user.pk))
+            created = self._prefetch_related(Recipe.objects.filter(
+                id__in=[recipe.id for recipe in recipes])).order_by('id')
+            data = self.get_serializer(created, many=True).data
+            for index, item in zip(valid_indexes, data):
+                results[index] = {
+                    'status': status.HTTP_201_CREATED,
+                    'data': item,
+                }
+        if len(valid_data) == len(items):
+            response_status = status.HTTP_201_CREATED
+        elif valid_data:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(results, status=response_status)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'export_format',
+                OpenApiTypes.STR, enum=list(EXPORT_FORMATS),
+                description='Формат експорту, за замовчуванням ndjson', ),
+            OpenApiParameter(
+                'tags',
+                OpenApiTypes.STR,
+                description='Список тегів для фільтрації', ),
+            OpenApiParameter(
+                'ingredients',
+                OpenApiTypes.STR,
+                description='Список інгредієнтів для фільтрації', ),
+        ],
+        responses={200: OpenApiTypes.STR},
+    )
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """
+        Потоковий експорт рецептів користувача без побудови всієї
+        відповіді в пам'яті
+        """
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'export_format': [f'Unsupported format: {export_format}']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        generator, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            generator(self.get_queryset()), content_type=content_type)
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{export_format}"'
+        return response
+
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            parser_classes=[ImageUploadParser])
     def upload_image(self, request, pk=None):
         """
-        Завантаження зображення для рецепта
+        Завантаження зображення для рецепта, зменшені копії генеруються
+        у фоні після збереження оригіналу
         """
         recipe = self.get_object()
         serializer = self.get_serializer(
@@ -85,7 +389,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             data=request.data,
         )
         if serializer.is_valid():
-            serializer.save()
+            recipe = serializer.save(image_variants={})
+            transaction.on_commit(partial(enqueue_image_variants, recipe))
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK,
@@ -95,6 +400,46 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'width', OpenApiTypes.INT, required=True,
+                enum=list(settings.RECIPE_IMAGE_RESIZE_WIDTHS),
+                description='Ширина копії, формат обирається за Accept',
+            ),
+        ],
+        responses={
+            (200, 'image/jpeg'): OpenApiTypes.BINARY,
+            (200, 'image/webp'): OpenApiTypes.BINARY,
+        },
+    )
+    @action(methods=['GET'], detail=True, url_path='image',
+            renderer_classes=[JPEGRenderer, WebPRenderer])
+    def resized_image(self, request, pk=None):
+        """
+        Зменшена копія зображення рецепта у форматі з Accept (WebP чи
+        JPEG), копії кешуються на диску
+        """
+        recipe = self.get_object()
+        serializer = serializers.RecipeImageResizeSerializer(
+            data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        if not recipe.image:
+            raise Http404()
+        width = serializer.validated_data['width']
+        renderer = request.accepted_renderer
+        etag = make_etag(recipe.image.name, width, renderer.format)
+        if etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            file = get_resized_image(recipe.image.name, width, renderer)
+            response = FileResponse(file, content_type=renderer.media_type)
+            response['Content-Length'] = os.fstat(file.fileno()).st_size
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'private, max-age={settings.RECIPE_IMAGE_RESIZE_MAX_AGE}')
+        return response
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -108,7 +453,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ]
     )
 )
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+class BaseRecipeAttrViewSet(AutocompleteMixin,
+                            CachedResponseMixin,
+                            viewsets.GenericViewSet,
                             # mixins.CreateModelMixin,
                             mixins.ListModelMixin,
                             mixins.UpdateModelMixin,
@@ -118,6 +465,8 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
     """
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetCursorPagination
+    ordering = ('-name',)
 
     def get_queryset(self):
         """
@@ -128,9 +477,10 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            # лічильник замість join з проміжною таблицею і distinct
+            queryset = queryset.filter(recipe_count__gt=0)
         return queryset.filter(
-            user=self.request.user).order_by('-name').distinct()
+            user=self.request.user).order_by(*self.ordering)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -138,7 +488,7 @@ class TagViewSet(BaseRecipeAttrViewSet):
     Вью для тегів
     """
     queryset = Tag.objects.all()
-    serializer_class = serializers.TagSerializer
+    serializer_class = serializers.TagDetailSerializer
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -146,4 +496,4 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     Вью для інгредієнтів
     """
     queryset = Ingredient.objects.all()
-    serializer_class = serializers.IngredientSerializer
+    serializer_class = serializers.IngredientDetailSerializer
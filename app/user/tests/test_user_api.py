@@ -1,6 +1,7 @@
 """
 Тест для API користувача
 """
+import msgpack
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -80,6 +81,19 @@ class PublicUserApiTests(TestCase):
         self.assertIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_create_token_msgpack(self):
+        """Тест створення токена з тілом і відповіддю у MessagePack"""
+        create_user(email='test@example.com', password='testpass123')
+        payload = {'email': 'test@example.com', 'password': 'testpass123'}
+        res = self.client.post(
+            TOKEN_URL, msgpack.packb(payload),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', msgpack.unpackb(res.content))
+
     def test_create_token_invalid_credentials(self):
         """Тест створення токена з невірними даними"""
         create_user(